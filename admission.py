@@ -0,0 +1,242 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# ─────────────────────────────────────────────
+#  Admission control and graceful degradation
+#
+#  Caps concurrent model.predict and LLM calls, makes callers queue with a
+#  deadline, and turns measured queueing delay into a degradation level:
+#
+#    0 FULL        everything on
+#    1 NO_LLM      serve cached / static recommendations instead of the LLM
+#    2 MINIMAL     also skip optional work (leaf crop, similar cases)
+#    3 BUSY        reject with a "busy" message
+# ─────────────────────────────────────────────
+FULL, NO_LLM, MINIMAL, BUSY = range(4)
+LEVEL_NAMES = ("full", "no_llm", "minimal", "busy")
+
+class Busy(Exception):
+    pass
+
+class _Pool:
+    def __init__(self, limit):
+        self.limit        = limit
+        self.sem          = threading.BoundedSemaphore(limit)
+        self.waiting      = 0
+        self.ewma_wait    = 0.0
+        self.ewma_service = 0.0
+        self.last_update  = time.perf_counter()
+
+class AdmissionController:
+    def __init__(self, max_inference=2, max_llm=4, deadline=5.0,
+                 thresholds=(0.5, 1.5, 3.0), alpha=0.2, half_life=2.0):
+        self.deadline   = deadline
+        self.half_life  = half_life
+        self.thresholds = thresholds
+        self.alpha      = alpha
+        self.pools      = {"inference": _Pool(max_inference), "llm": _Pool(max_llm)}
+        self._lock      = threading.Lock()
+        self.counts     = {"admitted": 0, "rejected": 0}
+
+    def queue_delay(self, kind="inference"):
+        # EWMA of observed waits lags a sudden burst, so also estimate the
+        # wait of whoever is queued right now from the mean service time.
+        # Once BUSY rejects requests before slot(), nothing refreshes the
+        # EWMA, so it decays with the time since the last slot event; that
+        # lets new requests through again to re-measure the real wait.
+        pool = self.pools[kind]
+        with self._lock:
+            idle = time.perf_counter() - pool.last_update
+            ewma = pool.ewma_wait * 0.5 ** (idle / self.half_life)
+            est  = pool.waiting / pool.limit * pool.ewma_service
+            return max(ewma, est)
+
+    def level(self):
+        delay = self.queue_delay("inference")
+        lvl   = FULL
+        for i, t in enumerate(self.thresholds):
+            if delay >= t:
+                lvl = i + 1
+        return lvl
+
+    @contextmanager
+    def slot(self, kind="inference", timeout=None):
+        pool    = self.pools[kind]
+        timeout = self.deadline if timeout is None else timeout
+        t0      = time.perf_counter()
+        with self._lock:
+            pool.waiting += 1
+        acquired = pool.sem.acquire(timeout=timeout)
+        waited   = time.perf_counter() - t0
+        with self._lock:
+            pool.waiting  -= 1
+            pool.ewma_wait += self.alpha * (waited - pool.ewma_wait)
+            pool.last_update = time.perf_counter()
+            self.counts["admitted" if acquired else "rejected"] += 1
+        if not acquired:
+            raise Busy(f"{kind} queue wait exceeded {timeout:.1f}s")
+        t1 = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            service = time.perf_counter() - t1
+            pool.sem.release()
+            with self._lock:
+                pool.ewma_service += self.alpha * (service - pool.ewma_service)
+                pool.last_update   = time.perf_counter()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counts)
+            for name, pool in self.pools.items():
+                out[name] = {"limit": pool.limit, "waiting": pool.waiting,
+                             "ewma_wait_s": round(pool.ewma_wait, 4),
+                             "ewma_service_s": round(pool.ewma_service, 4)}
+        out["level"] = LEVEL_NAMES[self.level()]
+        return out
+
+# ─────────────────────────────────────────────
+#  Local load generator
+#
+#  python admission.py --users 40 --duration 20 --infer-ms 80 --llm-ms 1500
+#  python admission.py --users 60 --duration 10 --infer-ms 500 --recovery 30
+#
+#  Simulated users run the Demo flow (classify, then recommendations) with
+#  sleep-based service times, so the controller can be exercised without a
+#  model or network.  Inference also holds one of --cores "CPU" tokens, so
+#  uncontrolled concurrency queues up the way real model.predict calls do.
+# ─────────────────────────────────────────────
+def _infer(cores, seconds):
+    with cores:
+        time.sleep(seconds)
+
+def simulate_request(ctl, cores, infer_s, llm_s, crop_s):
+    t0  = time.perf_counter()
+    lvl = ctl.level()
+    if lvl >= BUSY:
+        return lvl, "busy", time.perf_counter() - t0
+    try:
+        with ctl.slot("inference"):
+            _infer(cores, infer_s + (crop_s if lvl < MINIMAL else 0))
+    except Busy:
+        return BUSY, "busy", time.perf_counter() - t0
+    if lvl >= NO_LLM:
+        return lvl, "static", time.perf_counter() - t0
+    try:
+        with ctl.slot("llm", timeout=0.5):
+            time.sleep(llm_s)
+        return lvl, "llm", time.perf_counter() - t0
+    except Busy:
+        return lvl, "static", time.perf_counter() - t0
+
+def run_load(ctl, users, duration, infer_s, llm_s, crop_s, think_s, n_cores=2, seed=0):
+    cores   = threading.Semaphore(n_cores)
+    results = []
+    lock    = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def user(i):
+        rng = random.Random(seed + i)
+        while time.perf_counter() < stop_at:
+            r = simulate_request(ctl, cores, infer_s * rng.uniform(.7, 1.3), llm_s * rng.uniform(.5, 1.5), crop_s)
+            with lock:
+                results.append(r)
+            time.sleep(rng.expovariate(1 / think_s) if think_s > 0 else 0)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    lat     = np.array([r[2] for r in results]) if results else np.zeros(1)
+    served  = np.array([r[1] != "busy" for r in results]) if results else np.zeros(1, bool)
+    return {
+        "users":           users,
+        "requests":        len(results),
+        "throughput_rps":  round(len(results) / duration, 2),
+        "served_rate":     round(float(served.mean()), 4),
+        "p50_ms":          round(float(np.percentile(lat, 50)) * 1e3, 1),
+        "p95_ms":          round(float(np.percentile(lat, 95)) * 1e3, 1),
+        "served_p95_ms":   round(float(np.percentile(lat[served], 95)) * 1e3, 1) if served.any() else None,
+        "levels":          {LEVEL_NAMES[l]: sum(1 for r in results if r[0] == l) for l in range(4)},
+        "outcomes":        {o: sum(1 for r in results if r[1] == o) for o in ("llm", "static", "busy")},
+        "controller":      ctl.stats(),
+    }
+
+def run_recovery(ctl, users, burst, idle, infer_s, llm_s, crop_s, think_s, n_cores=2, step=0.25):
+    # overload for `burst` seconds, then go idle and sample the level until it is FULL again
+    row      = run_load(ctl, users, burst, infer_s, llm_s, crop_s, think_s, n_cores)
+    peak     = max((l for l in range(4) if row["levels"][LEVEL_NAMES[l]]), default=FULL)
+    t0       = time.perf_counter()
+    timeline = []
+    while time.perf_counter() - t0 < idle:
+        timeline.append((round(time.perf_counter() - t0, 2), LEVEL_NAMES[ctl.level()]))
+        if timeline[-1][1] == LEVEL_NAMES[FULL]:
+            break
+        time.sleep(step)
+    recovered = timeline[-1][1] == LEVEL_NAMES[FULL]
+    return {
+        "users":              users,
+        "burst_s":            burst,
+        "peak_level":         LEVEL_NAMES[peak],
+        "level_after_burst":  timeline[0][1],
+        "recovered":          recovered,
+        "recovered_after_s":  timeline[-1][0] if recovered else None,
+        "timeline":           timeline,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the admission controller")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--infer-ms", type=float, default=80)
+    parser.add_argument("--llm-ms", type=float, default=1500)
+    parser.add_argument("--crop-ms", type=float, default=2)
+    parser.add_argument("--think-ms", type=float, default=500)
+    parser.add_argument("--cores", type=int, default=2)
+    parser.add_argument("--max-inference", type=int, default=2)
+    parser.add_argument("--max-llm", type=int, default=4)
+    parser.add_argument("--deadline", type=float, default=5.0)
+    parser.add_argument("--half-life", type=float, default=2.0, help="seconds for an idle wait estimate to halve")
+    parser.add_argument("--no-control", action="store_true",
+                        help="baseline: effectively unlimited concurrency, no degradation")
+    parser.add_argument("--recovery", type=float, default=None, metavar="IDLE_S",
+                        help="after each --duration burst, idle up to IDLE_S seconds and report when the level is full again")
+    args = parser.parse_args(argv)
+
+    if args.recovery is not None:
+        rows = []
+        for n in args.users:
+            ctl = AdmissionController(args.max_inference, args.max_llm, args.deadline, half_life=args.half_life)
+            row = run_recovery(ctl, n, args.duration, args.recovery, args.infer_ms / 1e3, args.llm_ms / 1e3,
+                               args.crop_ms / 1e3, args.think_ms / 1e3, args.cores)
+            print(f"users={n:3d}  peak={row['peak_level']:7s} after burst={row['level_after_burst']:7s} "
+                  f"full again after {row['recovered_after_s']} s", file=sys.stderr)
+            rows.append(row)
+        print(json.dumps(rows, indent=2))
+        return 0
+
+    rows = []
+    for n in args.users:
+        if args.no_control:
+            ctl = AdmissionController(max_inference=10_000, max_llm=10_000, deadline=1e9,
+                                      thresholds=(1e9, 1e9, 1e9))
+        else:
+            ctl = AdmissionController(args.max_inference, args.max_llm, args.deadline, half_life=args.half_life)
+        row = run_load(ctl, n, args.duration, args.infer_ms / 1e3, args.llm_ms / 1e3,
+                       args.crop_ms / 1e3, args.think_ms / 1e3, args.cores)
+        print(f"users={n:3d}  rps={row['throughput_rps']:6.1f}  served={row['served_rate']:.0%}  "
+              f"p95={row['p95_ms']:.0f}ms  levels={row['levels']}", file=sys.stderr)
+        rows.append(row)
+    print(json.dumps(rows, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
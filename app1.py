@@ -1,29 +1,42 @@
 import os
 import json
-import hashlib
+import time
+import uuid
 import streamlit as st
 import streamlit.components.v1 as components
-import numpy as np
 import tensorflow as tf
 import requests
-from PIL import Image
+
+import static_assets
+from inference import generate_cache_key, load_and_preprocess_image, predict_with_embedding, model_fingerprint
+from leaf_crop import crop_to_leaf
+from history import PredictionHistory, SOURCES, top_k
+from near_duplicate import NearDuplicateIndex, dhash
+from recommendations import (OPENROUTER_API_KEY, OPENROUTER_URL, fetch_recommendations,
+                             cached_or_static_recommendations, kb_version)
+from admission import AdmissionController, Busy, NO_LLM, MINIMAL, BUSY
+from similarity import EmbeddingIndex, embed_image, INDEX_PATH as SIMILAR_CASES_PATH
+from validation import InvalidImage, MIN_PLANT_FRACTION, validate
 
 st.set_page_config(page_title="Plant Disease AI", page_icon="🌿", layout="wide")
 
 # ─────────────────────────────────────────────
 #  API & Model  (unchanged from your original)
 # ─────────────────────────────────────────────
-OPENROUTER_API_KEY = "YOUR_API_KEY"
+# Care advice comes from the bundled knowledge base; set PLANTAI_LLM_ENRICH=1
+# to add GPT-4o-mini notes on top of it.
+LLM_ENRICH = os.environ.get("PLANTAI_LLM_ENRICH", "0") == "1"
 
-try:
-    requests.post(
-        url="https://openrouter.ai/api/v1/chat/completions",
-        headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
-        json={"model": "openai/gpt-4o-mini", "messages": [{"role": "user", "content": "prompt"}]},
-        timeout=5
-    )
-except Exception:
-    pass
+if LLM_ENRICH:
+    try:
+        requests.post(
+            url=OPENROUTER_URL,
+            headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
+            json={"model": "openai/gpt-4o-mini", "messages": [{"role": "user", "content": "prompt"}]},
+            timeout=5
+        )
+    except Exception:
+        pass
 
 working_dir       = os.path.dirname(os.path.abspath(__file__))
 model_path        = os.path.join(working_dir, "trained_model", "plant_disease_prediction_model.h5")
@@ -35,6 +48,14 @@ except Exception as e:
     st.error(f"Model load error: {e}")
     model = None
 
+# History records carry the weights' fingerprint so a redeployed model
+# doesn't keep serving the previous model's answers for known images.
+@st.cache_data
+def get_model_id(path, mtime):
+    return model_fingerprint(path)
+
+MODEL_ID = get_model_id(model_path, os.path.getmtime(model_path)) if model is not None else None
+
 try:
     with open(class_indices_path) as f:
         class_indices = json.load(f)
@@ -44,50 +65,144 @@ except Exception as e:
 
 CACHE = {}
 
-def generate_cache_key(image):
-    return hashlib.md5(image.tobytes()).hexdigest()
-
-def load_and_preprocess_image(image, target_size=(128, 128)):
-    img       = image.resize(target_size)
-    img_array = np.array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    return img_array.astype("float32") / 255.0
-
-def fetch_recommendations(disease_name):
-    if disease_name in CACHE:
-        return CACHE[disease_name]
-    prompt = (f"The plant is healthy ({disease_name}). Give maintenance tips."
-              if "healthy" in disease_name.lower()
-              else f"Suggest treatment and prevention for {disease_name} in plants.")
-    try:
-        r = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
-            json={"model": "openai/gpt-4o-mini", "messages": [{"role": "user", "content": prompt}]},
-            timeout=30
-        )
-        data = r.json()
-        if "error" in data:
-            return f"API Error: {data['error']['message']}"
-        result = data["choices"][0]["message"]["content"]
-        CACHE[disease_name] = result
-        return result
-    except Exception as e:
-        return f"Exception: {e}"
-
-def predict_image_class(model, image, class_indices):
+# Uploads are checked (size, header, plant colour share) before any decode or
+# model work; PLANTAI_PLANT_CHECK=0 accepts images with little leaf colour.
+MAX_UPLOAD_MB = int(os.environ.get("PLANTAI_MAX_UPLOAD_MB", "10"))
+PLANT_CHECK   = os.environ.get("PLANTAI_PLANT_CHECK", "1") == "1"
+
+# Crop field photos to the detected leaf before resizing (leaf_crop.py).  Off
+# by default: the model was trained on full PlantVillage frames, so enable it
+# only once `python evaluate.py <dir> --compare-crop` shows no accuracy loss.
+LEAF_CROP = os.environ.get("PLANTAI_LEAF_CROP", "0") == "1"
+
+# Set PLANTAI_DECODE_WORKERS=N to preprocess uploads in N worker processes and
+# batch inference through the shared-memory server (see shm_server.py).  The
+# workers get the upload bytes and decode them with validation.decode_upload,
+# so EXIF orientation and the capped decode match what the Demo shows.
+DECODE_WORKERS = int(os.environ.get("PLANTAI_DECODE_WORKERS", "0"))
+
+@st.cache_resource
+def get_inference_server():
+    from shm_server import ShmInferenceServer
+    return ShmInferenceServer(n_workers=DECODE_WORKERS, model_file=model_path, crop_leaf=LEAF_CROP)
+
+# Near-identical shots of the same leaf (burst uploads) reuse the earlier
+# prediction when their dHash is within PHASH_MAX_DISTANCE bits.
+PHASH_MAX_DISTANCE = int(os.environ.get("PLANTAI_PHASH_DISTANCE", "6"))
+
+@st.cache_resource
+def get_near_duplicate_index(model_id):
+    return NearDuplicateIndex(max_distance=PHASH_MAX_DISTANCE, capacity=10_000)
+
+# Every prediction is appended to a columnar history log (history.py); full
+# chunks spill to prediction_history/ so memory stays bounded.
+@st.cache_resource
+def get_history():
+    return PredictionHistory(spill_dir=os.path.join(working_dir, "prediction_history"),
+                             chunk_rows=4096, max_chunks=64)
+
+def session_id():
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
+
+# Caps concurrent inference/LLM calls across all sessions and degrades in
+# stages (no LLM -> no leaf crop -> busy) as the measured queue delay grows.
+@st.cache_resource
+def get_admission_controller():
+    return AdmissionController(max_inference=int(os.environ.get("PLANTAI_MAX_INFERENCE", "2")),
+                               max_llm=int(os.environ.get("PLANTAI_MAX_LLM", "4")),
+                               deadline=5.0)
+
+# Confirmed reference cases indexed by their Dense(128) embedding; build with
+# `python similarity.py build <labeled_dir>`.  The panel is hidden without it.
+@st.cache_resource
+def get_similar_cases():
+    if not os.path.exists(SIMILAR_CASES_PATH):
+        return None
+    return EmbeddingIndex.load(SIMILAR_CASES_PATH)
+
+def predict_image_class(model, image, class_indices, leaf_crop=LEAF_CROP, return_embedding=False, data=None):
     if model is None:
-        return "Model not loaded."
-    ck = generate_cache_key(image)
+        return ("Model not loaded.", None) if return_embedding else "Model not loaded."
+    # the embedding must be preprocessed like the indexed references, so the
+    # prediction's own forward pass is only reused when the crop setting matches
+    index     = get_similar_cases() if return_embedding else None
+    crop_emb  = index.crop_leaf if index is not None else leaf_crop
+    name, emb = _predict(model, image, class_indices, leaf_crop, return_embedding and crop_emb == leaf_crop, data)
+    if return_embedding and emb is None:
+        emb = embed_image(model, image, crop_emb)
+    return (name, emb) if return_embedding else name
+
+def _predict(model, image, class_indices, leaf_crop, want_embedding, data=None):
+    t0  = time.perf_counter()
+    ck  = generate_cache_key(image)
+    emb = None
     if ck in CACHE:
-        return CACHE[ck]
-    preds = model.predict(load_and_preprocess_image(image))
-    if preds.size == 0:
-        return "No prediction."
-    idx  = int(np.argmax(preds, axis=1)[0])
-    name = class_indices.get(str(idx), "Unknown class")
+        return CACHE[ck], None
+
+    source = "model"
+    prev   = get_history().latest(ck, model_id=MODEL_ID)
+    ph     = dhash(image)
+    hit    = get_near_duplicate_index(MODEL_ID).lookup(ph) if prev is None else None
+    if prev is not None:
+        topk_idx, topk_prob, source = prev["topk_idx"], prev["topk_prob"], "history"
+    elif hit is not None:
+        (topk_idx, topk_prob), source = hit[0], "near_duplicate"
+    else:
+        topk_idx = None
+        if DECODE_WORKERS and data is not None:
+            idx, conf = get_inference_server().classify(data)
+            # -1 marks a slot the worker could not decode; predict in-process instead
+            if idx >= 0:
+                topk_idx, topk_prob, source = [idx], [conf], "server"
+        if topk_idx is None:
+            x = load_and_preprocess_image(crop_to_leaf(image) if leaf_crop else image)
+            if want_embedding:
+                preds, embs = predict_with_embedding(model, x)
+                emb = embs[0]
+            else:
+                preds = model.predict(x)
+            if preds.size == 0:
+                return "No prediction.", None
+            topk_idx, topk_prob = top_k(preds[0])
+
+    name = class_indices.get(str(int(topk_idx[0])), "Unknown class")
     CACHE[ck] = name
-    return name
+    if source in ("model", "server"):
+        get_near_duplicate_index(MODEL_ID).add(ph, (topk_idx, topk_prob))
+    get_history().append(session_id(), ck, topk_idx, topk_prob,
+                         (time.perf_counter() - t0) * 1000, source, model_id=MODEL_ID)
+    return name, emb
+
+def render_similar_cases(emb, k=5):
+    index = get_similar_cases()
+    if index is None or emb is None:
+        return
+    hits = index.query(emb, k=k)
+    st.markdown('<p style="font-family:Orbitron,monospace;color:#00ff99;'
+                'font-size:.85rem;letter-spacing:.08em;">🧬 SIMILAR CONFIRMED CASES</p>',
+                unsafe_allow_html=True)
+    for col, (score, label, path) in zip(st.columns(len(hits)), hits):
+        with col:
+            if os.path.exists(path):
+                st.image(path, use_container_width=True)
+            st.caption(f"{label.replace('___', ' · ').replace('_', ' ')}\n\n{score:.0%} similar")
+
+def render_history(class_indices, limit=20):
+    rows = get_history().query(session_id=session_id(), limit=limit)
+    if len(rows) == 0:
+        return
+    table = [{
+        "Time":    time.strftime("%H:%M:%S", time.localtime(r["ts"])),
+        "Class":   class_indices.get(str(int(r["class_idx"])), "Unknown class"),
+        "Top-3":   ", ".join(f"{class_indices.get(str(int(i)), '?')} {float(p):.0%}"
+                             for i, p in zip(r["topk_idx"], r["topk_prob"]) if i >= 0),
+        "ms":      round(float(r["latency_ms"]), 1),
+        "Source":  SOURCES[r["source"]],
+    } for r in rows[::-1]]
+    with st.expander(f"🕘 Prediction History ({len(rows)})"):
+        st.dataframe(table, use_container_width=True, hide_index=True)
 
 # ─────────────────────────────────────────────
 #  Navigation via query_params
@@ -98,177 +213,38 @@ if page not in PAGES:
     page = "Home"
 
 # ─────────────────────────────────────────────
-#  CSS
+#  CSS & static assets
+#  The theme CSS and game page live in frontend/ and are inlined by default,
+#  which works behind any single-port or HTTPS host.  To send them once as
+#  content-hashed, long-cached files (static_assets.py) instead, either set
+#  PLANTAI_STATIC_URL to where a reverse proxy/CDN serves static/ (ideally a
+#  same-origin path such as /static-assets), or set PLANTAI_STATIC_PORT to
+#  run the bundled file server on that port.
 # ─────────────────────────────────────────────
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;700;900&family=Syne:wght@400;600;800&display=swap');
-
-[data-testid="stSidebar"]{display:none !important;}
-[data-testid="stHeader"] {display:none !important;}
-#MainMenu,footer         {display:none !important;}
-
-html,body,[data-testid="stAppViewContainer"],[data-testid="stMain"],.main,.block-container{
-    background:#050f05 !important; color:#e8fce8 !important;
-    font-family:'Syne',sans-serif !important; padding-top:0 !important;}
-.block-container{padding-top:88px !important; max-width:1100px !important;}
-
-/* ── NAVBAR ── */
-.navbar{
-    position:fixed;top:0;left:0;right:0;z-index:99999;
-    display:flex;align-items:center;justify-content:space-between;
-    padding:0 40px;height:64px;
-    background:rgba(3,10,3,0.93);
-    backdrop-filter:blur(24px);-webkit-backdrop-filter:blur(24px);
-    border-bottom:1px solid rgba(0,255,100,0.14);
-    box-shadow:0 4px 40px rgba(0,255,68,0.07);
-    animation:slideDown .55s cubic-bezier(.16,1,.3,1) both;}
-@keyframes slideDown{from{transform:translateY(-100%);opacity:0;}to{transform:translateY(0);opacity:1;}}
-.navbar::after{
-    content:'';position:absolute;top:0;left:-60%;width:55%;height:100%;
-    background:linear-gradient(90deg,transparent,rgba(0,255,100,.05),transparent);
-    animation:scan 4s linear infinite;pointer-events:none;}
-@keyframes scan{0%{left:-60%}100%{left:120%}}
-
-.nav-logo{
-    font-family:'Orbitron',monospace;font-weight:900;font-size:1rem;
-    color:#00ff99;letter-spacing:.12em;white-space:nowrap;
-    text-decoration:none !important;display:flex;align-items:center;gap:9px;
-    animation:logoPulse 3s ease-in-out infinite;}
-@keyframes logoPulse{0%,100%{text-shadow:0 0 18px #00ff9966;}50%{text-shadow:0 0 36px #00ff99cc,0 0 60px #00ff4444;}}
-.nav-dot{
-    display:inline-block;width:7px;height:7px;border-radius:50%;
-    background:#00ff99;box-shadow:0 0 8px #00ff99;
-    animation:dotBlink 1.5s ease-in-out infinite;flex-shrink:0;}
-@keyframes dotBlink{0%,100%{opacity:1;transform:scale(1);}50%{opacity:.2;transform:scale(.5);}}
-
-.nav-links{display:flex;gap:4px;align-items:center;}
-.nav-pill{
-    position:relative;font-family:'Orbitron',monospace;font-size:.68rem;font-weight:700;
-    letter-spacing:.1em;color:#6abf7a;padding:9px 22px;border-radius:50px;
-    border:1px solid transparent;background:transparent;text-decoration:none !important;
-    white-space:nowrap;overflow:hidden;
-    transition:color .25s,border-color .25s,background .25s,box-shadow .25s,transform .2s;}
-.nav-pill:before{
-    content:'';position:absolute;inset:0;border-radius:50px;
-    background:linear-gradient(90deg,#00ff9920,#00cc5510);opacity:0;transition:opacity .3s;}
-.nav-pill:hover{color:#00ff99 !important;border-color:rgba(0,255,100,.4);
-    box-shadow:0 0 16px rgba(0,255,100,.18);transform:translateY(-2px);}
-.nav-pill:hover:before{opacity:1;}
-.nav-pill.active{color:#000 !important;background:linear-gradient(90deg,#00ff99,#00dd66) !important;
-    border-color:#00ff99 !important;box-shadow:0 0 22px #00ff9955,0 4px 14px #00ff4433 !important;
-    transform:translateY(-2px);}
-.nav-pill.active:after{
-    content:'';position:absolute;bottom:0;left:50%;transform:translateX(-50%);
-    width:55%;height:2px;background:#00ff99;border-radius:99px;box-shadow:0 0 8px #00ff99;}
-
-/* ── ANIMATIONS ── */
-@keyframes fadeUp{from{opacity:0;transform:translateY(28px);}to{opacity:1;transform:translateY(0);}}
-@keyframes fadeLeft{from{opacity:0;transform:translateX(-30px);}to{opacity:1;transform:translateX(0);}}
-@keyframes fadeRight{from{opacity:0;transform:translateX(30px);}to{opacity:1;transform:translateX(0);}}
-@keyframes zoomIn{from{opacity:0;transform:scale(.93);}to{opacity:1;transform:scale(1);}}
-.anim-fadeup   {animation:fadeUp    .65s cubic-bezier(.16,1,.3,1) both;}
-.anim-fadeleft {animation:fadeLeft  .65s cubic-bezier(.16,1,.3,1) both;}
-.anim-faderight{animation:fadeRight .65s cubic-bezier(.16,1,.3,1) both;}
-.anim-zoomin   {animation:zoomIn    .65s cubic-bezier(.16,1,.3,1) both;}
-.d1{animation-delay:.08s;}.d2{animation-delay:.18s;}.d3{animation-delay:.28s;}.d4{animation-delay:.38s;}
-
-[data-testid="stMarkdownContainer"],[data-testid="stFileUploader"],
-[data-testid="stImage"],[data-testid="stAlert"],div.stButton{animation:fadeUp .55s ease both;}
-
-/* ── HEADING ── */
-.main-heading{
-    text-align:center;font-family:'Orbitron',monospace !important;
-    font-size:clamp(1.4rem,3.5vw,2.4rem) !important;font-weight:900 !important;
-    color:#00ff99 !important;text-shadow:0 0 30px #00ff9966,0 0 60px #00ff4422 !important;
-    letter-spacing:.06em !important;margin-bottom:28px !important;}
-
-/* ── GLASS CARD ── */
-.glass{
-    background:rgba(0,255,100,.04);border:1px solid rgba(0,255,100,.18);
-    border-radius:16px;padding:28px 32px;margin-bottom:22px;
-    transition:border-color .3s,box-shadow .3s,transform .3s;}
-.glass:hover{border-color:rgba(0,255,100,.4);box-shadow:0 8px 40px rgba(0,255,100,.1);transform:translateY(-3px);}
-.glass h2,.glass h3{font-family:'Orbitron',monospace;color:#00ff99;letter-spacing:.05em;
-    margin-top:0;border-bottom:1px solid rgba(0,255,100,.2);padding-bottom:8px;}
-.glass p,.glass li{color:#c8f0c8;line-height:1.8;font-family:'Syne',sans-serif;}
-.glass b,.glass strong{color:#00ff99;}
-.glass ol{color:#c8f0c8;padding-left:1.4rem;}
-.glass ol li{margin-bottom:8px;line-height:1.8;}
-
-/* ── MARKDOWN ── */
-[data-testid="stMarkdownContainer"] p,
-[data-testid="stMarkdownContainer"] li{color:#c8f0c8 !important;font-family:'Syne',sans-serif !important;line-height:1.8 !important;}
-[data-testid="stMarkdownContainer"] strong{color:#00ff99 !important;}
-[data-testid="stMarkdownContainer"] h2,
-[data-testid="stMarkdownContainer"] h3{font-family:'Orbitron',monospace !important;color:#00ff99 !important;
-    letter-spacing:.05em !important;text-shadow:0 0 14px #00ff9944 !important;
-    border-bottom:1px solid rgba(0,255,100,.2) !important;padding-bottom:8px !important;margin-top:28px !important;}
-[data-testid="stMarkdownContainer"] a{color:#00ff99 !important;text-decoration:underline !important;}
-[data-testid="stMarkdownContainer"] hr{border-color:rgba(0,255,100,.2) !important;margin:24px 0 !important;}
-p,li{color:#c8f0c8 !important;font-family:'Syne',sans-serif !important;}
-
-/* ── FILE UPLOADER ── */
-[data-testid="stFileUploader"]{border:2px dashed rgba(0,255,100,.35) !important;
-    border-radius:14px !important;background:rgba(0,255,100,.04) !important;
-    padding:12px !important;transition:border-color .3s,box-shadow .3s !important;}
-[data-testid="stFileUploader"]:hover{border-color:#00ff99 !important;box-shadow:0 0 20px rgba(0,255,100,.1) !important;}
-[data-testid="stFileUploader"] *{color:#c8f0c8 !important;font-family:'Syne',sans-serif !important;}
-
-/* ── BUTTON ── */
-div.stButton>button{
-    background:linear-gradient(90deg,#00ff99,#00cc55) !important;color:#000 !important;
-    font-family:'Orbitron',monospace !important;font-weight:700 !important;font-size:.82rem !important;
-    letter-spacing:.06em !important;border:none !important;border-radius:8px !important;
-    padding:14px 36px !important;position:relative;overflow:hidden;transition:transform .2s,box-shadow .2s !important;}
-div.stButton>button:hover{transform:scale(1.05) translateY(-2px) !important;box-shadow:0 0 28px #00ff9977 !important;}
-
-/* ── ALERTS ── */
-[data-testid="stAlert"]{border-radius:12px !important;border-left:4px solid #00ff99 !important;
-    background:rgba(0,255,100,.06) !important;}
-[data-testid="stAlert"] *{color:#c8f0c8 !important;}
-
-/* ── IMAGES ── */
-img{border-radius:12px !important;box-shadow:0 6px 30px rgba(0,255,100,.15) !important;
-    transition:transform .3s,box-shadow .3s !important;}
-img:hover{transform:scale(1.01) !important;box-shadow:0 12px 40px rgba(0,255,100,.25) !important;}
-
-[data-testid="stSpinner"] *{color:#00ff99 !important;}
-::-webkit-scrollbar{width:6px;}
-::-webkit-scrollbar-track{background:transparent;}
-::-webkit-scrollbar-thumb{background:#00ff9966;border-radius:99px;}
-
-/* ── FOOTER ── */
-.footer{position:fixed;bottom:0;left:0;width:100%;
-    background:rgba(3,10,3,.93);border-top:1px solid rgba(0,255,100,.16);
-    backdrop-filter:blur(12px);color:#00ff99;text-align:center;padding:10px;
-    font-size:.68rem;font-family:'Orbitron',monospace;letter-spacing:.12em;z-index:99998;}
-
-/* ── SKILL BARS ── */
-.skill-wrap{margin:10px 0;}
-.skill-label{font-size:.82rem;font-weight:600;color:#c8f0c8;margin-bottom:5px;
-    display:flex;justify-content:space-between;}
-.skill-label span{color:#00ff99;}
-.skill-track{height:8px;background:rgba(0,255,100,.1);border-radius:99px;overflow:hidden;}
-.skill-fill{height:100%;border-radius:99px;background:linear-gradient(90deg,#00ff99,#00cc55);
-    animation:growBar 1.3s cubic-bezier(.16,1,.3,1) both;animation-delay:.3s;}
-@keyframes growBar{from{width:0 !important;}}
-
-/* ── CONTACT CHIPS ── */
-.contact-row{display:flex;flex-wrap:wrap;gap:12px;margin:16px 0;}
-.contact-chip{display:flex;align-items:center;gap:8px;
-    background:rgba(0,255,100,.06);border:1px solid rgba(0,255,100,.22);
-    border-radius:50px;padding:9px 20px;font-size:.82rem;font-weight:600;
-    color:#c8f0c8;text-decoration:none !important;
-    transition:background .25s,border-color .25s,transform .2s,box-shadow .2s;}
-.contact-chip:hover{background:rgba(0,255,100,.14);border-color:#00ff99;
-    color:#00ff99 !important;transform:translateY(-2px);box-shadow:0 4px 18px rgba(0,255,100,.15);}
-
-/* ── PARTICLE BG ── */
-#particle-bg{position:fixed;top:0;left:0;width:100%;height:100%;
-    pointer-events:none;z-index:0;opacity:.3;}
-</style>
-""", unsafe_allow_html=True)
+STATIC_URL    = os.environ.get("PLANTAI_STATIC_URL")
+STATIC_PORT   = int(os.environ.get("PLANTAI_STATIC_PORT", "0"))
+INLINE_ASSETS = os.environ.get("PLANTAI_INLINE_ASSETS", "0") == "1" or not (STATIC_URL or STATIC_PORT)
+
+@st.cache_resource
+def get_static_assets():
+    hashed = static_assets.publish()
+    if not STATIC_URL:
+        static_assets.serve(STATIC_PORT)
+    return hashed
+
+@st.cache_data
+def inline_asset(name):
+    return static_assets.read_asset(name)
+
+def asset_url(name):
+    context = getattr(st, "context", None)          # public request headers, Streamlit >= 1.37
+    host    = context.headers.get("Host") if context is not None else None
+    return f"{static_assets.base_url(STATIC_PORT, host)}/{get_static_assets()[name]}"
+
+if INLINE_ASSETS:
+    st.markdown(f"<style>\n{inline_asset('theme.css')}</style>", unsafe_allow_html=True)
+else:
+    st.markdown(f'<link rel="stylesheet" href="{asset_url("theme.css")}">', unsafe_allow_html=True)
 
 # ─────────────────────────────────────────────
 #  Particle background
@@ -370,7 +346,7 @@ if page == "Home":
         <strong>ML / Deep Learning:</strong> TensorFlow · Keras · Pre-trained CNN (PlantVillage)<br>
         <strong>Data Processing:</strong> Pillow (PIL) · NumPy · JSON<br>
         <strong>Web Framework:</strong> Streamlit · Custom CSS · Orbitron font<br>
-        <strong>AI Recommendations:</strong> OpenRouter API (GPT-4o-mini)<br>
+        <strong>Recommendations:</strong> Bundled knowledge base · optional OpenRouter API (GPT-4o-mini)<br>
         <strong>System:</strong> OS Module · Hashlib Cache
         </p>
     </div>
@@ -404,8 +380,13 @@ elif page == "Demo":
     with col1:
         uploaded_image = st.file_uploader("📁 Upload a leaf image...", type=["jpg","jpeg","png"])
         if uploaded_image is not None:
-            image = Image.open(uploaded_image)
-            st.image(image, caption="Uploaded Image", use_container_width=True)
+            try:
+                image = validate(uploaded_image.getvalue(), max_bytes=MAX_UPLOAD_MB * 2**20,
+                                 min_plant_fraction=MIN_PLANT_FRACTION if PLANT_CHECK else 0)
+                st.image(image, caption="Uploaded Image", use_container_width=True)
+            except InvalidImage as e:
+                st.error(f"🚫 {e}")
+                uploaded_image = None
 
     with col2:
         st.markdown('<p style="font-family:Orbitron,monospace;color:#00ff99;'
@@ -413,19 +394,45 @@ elif page == "Demo":
                     unsafe_allow_html=True)
         if uploaded_image is not None:
             if st.button("🔍 Classify Disease"):
-                prediction = predict_image_class(model, image, class_indices)
-                st.success(f"✅ Prediction: 🌿 {prediction} 🌿")
-                with st.spinner("🌿 Getting AI recommendations..."):
-                    rec = fetch_recommendations(prediction)
-                st.info(f"🌱 Recommended Care:\n\n{rec}")
+                ctl   = get_admission_controller()
+                level = ctl.level()
+                try:
+                    if level >= BUSY:
+                        raise Busy("degraded to busy")
+                    with ctl.slot("inference"):
+                        prediction, embedding = predict_image_class(model, image, class_indices,
+                                                                    leaf_crop=LEAF_CROP and level < MINIMAL,
+                                                                    return_embedding=get_similar_cases() is not None and level < MINIMAL,
+                                                                    data=uploaded_image.getvalue())
+                except Busy:
+                    prediction, embedding = None, None
+                    st.warning("⏳ The server is busy right now — please try again in a few seconds.")
+                except TimeoutError:
+                    prediction, embedding = None, None
+                    st.error("⌛ Classification timed out — please try again.")
+                if prediction is not None:
+                    st.success(f"✅ Prediction: 🌿 {prediction} 🌿")
+                    st.info(f"🌱 Recommended Care:\n\n{cached_or_static_recommendations(prediction)}")
+                    st.caption(f"Knowledge base v{kb_version()}")
+                    render_similar_cases(embedding)
+                    if LLM_ENRICH and level < NO_LLM:
+                        try:
+                            with st.spinner("🌿 Getting AI recommendations..."):
+                                with ctl.slot("llm", timeout=0.5):
+                                    rec = fetch_recommendations(prediction)
+                            st.info(f"🤖 AI Notes:\n\n{rec}")
+                        except Busy:
+                            pass
         else:
             st.markdown('<p style="color:rgba(0,255,100,.35);padding-top:30px;text-align:center;">'
                         '← Upload an image first</p>', unsafe_allow_html=True)
 
+    render_history(class_indices)
+
     # ──────────────────────────────────────────
     #  PIXEL PLANT DEFENDER GAME
-    #  KEY FIX: Use st.components.v1.html() instead of st.markdown()
-    #  This renders in a proper iframe where JavaScript actually executes!
+    #  Rendered in an iframe so its JavaScript actually runs; the page itself
+    #  is frontend/game.html, served as a cached static file.
     # ──────────────────────────────────────────
     st.markdown("""
     <div style="margin:40px 0 16px;">
@@ -440,416 +447,10 @@ elif page == "Demo":
     </div>
     """, unsafe_allow_html=True)
 
-    # The game is rendered via components.html() so JS actually runs
-    components.html("""
-<!DOCTYPE html>
-<html>
-<head>
-<meta charset="UTF-8">
-<style>
-  @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@700;900&display=swap');
-  * { margin:0; padding:0; box-sizing:border-box; }
-  body {
-    background:#030f03;
-    display:flex; flex-direction:column; align-items:center;
-    font-family:'Orbitron',monospace;
-    overflow-x:hidden;
-    overflow-y:auto;
-    padding:0; margin:0;
-  }
-  #level-banner {
-    font-size:.9rem; font-weight:900; color:#00ff99;
-    text-shadow:0 0 20px #00ff9966;
-    letter-spacing:.12em; text-align:center;
-    margin:10px 0 4px;
-  }
-  .game-ui {
-    display:flex; gap:10px; align-items:center; flex-wrap:wrap;
-    justify-content:center; margin-bottom:8px;
-  }
-  .game-stat {
-    background:rgba(0,255,100,.07); border:1px solid rgba(0,255,100,.25);
-    border-radius:8px; padding:6px 14px; font-size:.65rem; color:#00ff99;
-    letter-spacing:.08em;
-  }
-  .game-btn {
-    background:linear-gradient(90deg,#00ff99,#00dd66); color:#000;
-    border:none; border-radius:8px; padding:8px 18px;
-    font-family:'Orbitron',monospace; font-size:.65rem; font-weight:700;
-    letter-spacing:.08em; cursor:pointer;
-    transition:transform .2s, box-shadow .2s;
-  }
-  .game-btn:hover { transform:scale(1.05); box-shadow:0 0 16px #00ff9966; }
-  #game-canvas {
-    border:2px solid rgba(0,255,100,.4); border-radius:8px;
-    box-shadow:0 0 30px rgba(0,255,100,.15);
-    image-rendering:pixelated; background:#030f03;
-    display:block;
-  }
-  .game-controls {
-    color:rgba(0,255,100,.5); font-size:.58rem;
-    letter-spacing:.1em; margin-top:8px; text-align:center;
-  }
-  .ctrl-btn {
-    background:rgba(0,255,100,.1);
-    border:2px solid rgba(0,255,100,.5);
-    border-radius:12px;
-    color:#00ff99;
-    font-family:'Orbitron',monospace;
-    font-size:1.2rem;
-    font-weight:900;
-    padding:16px 30px;
-    cursor:pointer;
-    user-select:none;
-    -webkit-user-select:none;
-    touch-action:manipulation;
-    transition:background .12s, box-shadow .12s, transform .1s;
-    min-width:72px;
-  }
-  .ctrl-btn:active {
-    background:rgba(0,255,100,.35) !important;
-    box-shadow:0 0 24px #00ff9988;
-    transform:scale(0.94);
-  }
-  .ctrl-btn:hover {
-    background:rgba(0,255,100,.2);
-    box-shadow:0 0 14px #00ff9944;
-  }
-  .shoot-btn {
-    font-size:.72rem;
-    padding:16px 34px;
-    background:rgba(0,255,100,.18);
-    border-color:#00ff99;
-    box-shadow:0 0 14px #00ff9933;
-    letter-spacing:.08em;
-  }
-</style>
-</head>
-<body>
-
-<div id="level-banner">LEVEL 1 — SEEDLING</div>
-<div class="game-ui">
-  <div class="game-stat" id="gs-score">SCORE: 0</div>
-  <div class="game-stat" id="gs-lives">LIVES: 3</div>
-  <div class="game-stat" id="gs-level">LEVEL: 1/3</div>
-  <div class="game-stat" id="gs-bugs">BUGS: 0/10</div>
-  <button class="game-btn" onclick="startGame()">▶ START</button>
-  <button class="game-btn" onclick="restartGame()">↺ RESTART</button>
-</div>
-<canvas id="game-canvas" width="620" height="340"></canvas>
-<div class="game-controls">
-  ARROW KEYS / WASD TO MOVE &nbsp;|&nbsp; SPACE OR UP TO SHOOT &nbsp;|&nbsp; OR USE BUTTONS BELOW
-</div>
-
-<!-- On-screen controls -->
-<div style="display:flex;gap:12px;align-items:center;justify-content:center;margin-top:14px;flex-wrap:wrap;">
-  <!-- LEFT -->
-  <button class="ctrl-btn" id="btn-left"
-    onpointerdown="keys['ArrowLeft']=true" onpointerup="keys['ArrowLeft']=false" onpointerleave="keys['ArrowLeft']=false">
-    ◀
-  </button>
-  <!-- SHOOT -->
-  <button class="ctrl-btn shoot-btn" id="btn-shoot"
-    onpointerdown="keys[' ']=true" onpointerup="keys[' ']=false" onpointerleave="keys[' ']=false">
-    🔫 SHOOT
-  </button>
-  <!-- RIGHT -->
-  <button class="ctrl-btn" id="btn-right"
-    onpointerdown="keys['ArrowRight']=true" onpointerup="keys['ArrowRight']=false" onpointerleave="keys['ArrowRight']=false">
-    ▶
-  </button>
-</div>
-
-<script>
-(function(){
-  var canvas = document.getElementById('game-canvas');
-  var ctx = canvas.getContext('2d');
-  var W = canvas.width, H = canvas.height;
-
-  var LEVELS = [
-    {name:'LEVEL 1 - SEEDLING', total:10, spd:0.7, frate:20, rows:2},
-    {name:'LEVEL 2 - SAPLING',  total:16, spd:1.2, frate:15, rows:3},
-    {name:'LEVEL 3 - FINAL BOSS',total:24,spd:1.8, frate:10, rows:4}
-  ];
-
-  var state='idle', score=0, lives=3, lvl=0, kills=0;
-  var player, bullets, bugs, particles, bgStars;
-  var bugDir=1, frame=0, cooldown=0;
-  var keys={}; window.keys=keys;
-
-  function hud(){
-    var cfg=LEVELS[lvl];
-    document.getElementById('gs-score').textContent='SCORE: '+score;
-    document.getElementById('gs-lives').textContent='LIVES: '+lives;
-    document.getElementById('gs-level').textContent='LEVEL: '+(lvl+1)+'/3';
-    document.getElementById('gs-bugs').textContent='BUGS: '+kills+'/'+cfg.total;
-    document.getElementById('level-banner').textContent=cfg.name;
-  }
-
-  function initGame(){
-    var cfg=LEVELS[lvl];
-    player={x:W/2-12, y:H-50, w:24, h:24, spd:3.5};
-    bullets=[]; particles=[];
-    bugDir=1; frame=0; cooldown=0; kills=0;
-
-    bugs=[];
-    var cols=Math.ceil(cfg.total/cfg.rows);
-    var count=0;
-    for(var r=0;r<cfg.rows&&count<cfg.total;r++){
-      for(var c=0;c<cols&&count<cfg.total;c++){
-        bugs.push({
-          x:50+c*50, y:40+r*34,
-          w:18, h:14, alive:true,
-          at:Math.random()*6.28,
-          row:r,
-          ebullets:[],
-          stimer:60+Math.floor(Math.random()*80)
-        });
-        count++;
-      }
-    }
-    bgStars=[];
-    for(var i=0;i<40;i++) bgStars.push({
-      x:Math.random()*W, y:Math.random()*H,
-      r:Math.random()*1.2+.3,
-      o:Math.random()*.4+.1,
-      vy:Math.random()*.3+.1
-    });
-    hud();
-  }
-
-  function pr(x,y,w,h,col,glow){
-    if(glow){ctx.shadowBlur=10;ctx.shadowColor=col;}
-    ctx.fillStyle=col;
-    ctx.fillRect(Math.round(x),Math.round(y),w,h);
-    ctx.shadowBlur=0;
-  }
-
-  function drawPlayer(p){
-    pr(p.x+8,  p.y,    8, 6,  '#00ff99',true);
-    pr(p.x+4,  p.y+6,  16,8,  '#00cc55',true);
-    pr(p.x,    p.y+8,  24,12, '#00ff99',true);
-    pr(p.x+8,  p.y+14, 8, 8,  '#00cc55',false);
-    pr(p.x+10, p.y-4,  4, 6,  '#aaff44',true);
-    ctx.fillStyle='rgba(0,255,100,.4)';
-    ctx.beginPath();
-    ctx.moveTo(p.x,p.y+10);ctx.lineTo(p.x-10,p.y+20);ctx.lineTo(p.x,p.y+22);
-    ctx.moveTo(p.x+p.w,p.y+10);ctx.lineTo(p.x+p.w+10,p.y+20);ctx.lineTo(p.x+p.w,p.y+22);
-    ctx.fill();
-  }
-
-  var BUGCOLS=['#ff4444','#ff8800','#ff00cc'];
-  function drawBug(b){
-    if(!b.alive)return;
-    var col=BUGCOLS[b.row%3];
-    var blink=Math.sin(b.at+frame*.1)>0;
-    ctx.shadowBlur=8;ctx.shadowColor=col;
-    ctx.fillStyle=col;
-    ctx.fillRect(Math.round(b.x+4),Math.round(b.y),10,7);
-    ctx.fillRect(Math.round(b.x+2),Math.round(b.y+4),14,7);
-    ctx.fillRect(Math.round(b.x+4),Math.round(b.y+8),10,4);
-    ctx.shadowBlur=0;
-    ctx.fillStyle=blink?'#fff':col;
-    ctx.fillRect(Math.round(b.x+5),Math.round(b.y+1),3,3);
-    ctx.fillRect(Math.round(b.x+10),Math.round(b.y+1),3,3);
-    ctx.strokeStyle=col;ctx.lineWidth=1;
-    ctx.beginPath();
-    ctx.moveTo(b.x+6,b.y);ctx.lineTo(b.x+3,b.y-5);
-    ctx.moveTo(b.x+12,b.y);ctx.lineTo(b.x+15,b.y-5);
-    ctx.stroke();
-  }
-
-  function drawBullet(b){
-    ctx.shadowBlur=8;ctx.shadowColor='#aaff44';
-    ctx.fillStyle='#aaff44';
-    ctx.fillRect(Math.round(b.x),Math.round(b.y),3,9);
-    ctx.shadowBlur=0;
-  }
-
-  function drawEBullet(b){
-    ctx.shadowBlur=6;ctx.shadowColor='#ff4444';
-    ctx.fillStyle='#ff4444';
-    ctx.fillRect(Math.round(b.x),Math.round(b.y),3,7);
-    ctx.shadowBlur=0;
-  }
-
-  function spawnFX(x,y,col,n){
-    for(var i=0;i<n;i++) particles.push({
-      x:x,y:y,
-      vx:(Math.random()-.5)*4,
-      vy:(Math.random()-.5)*4-1,
-      s:Math.floor(Math.random()*4)+2,
-      col:col,life:30,max:30
-    });
-  }
-
-  function drawFX(){
-    for(var i=particles.length-1;i>=0;i--){
-      var p=particles[i];
-      ctx.globalAlpha=p.life/p.max;
-      ctx.fillStyle=p.col;
-      ctx.fillRect(Math.round(p.x),Math.round(p.y),p.s,p.s);
-      p.x+=p.vx;p.y+=p.vy;p.vy+=.08;p.life--;
-      if(p.life<=0)particles.splice(i,1);
-    }
-    ctx.globalAlpha=1;
-  }
-
-  function drawBG(){
-    for(var i=0;i<bgStars.length;i++){
-      var s=bgStars[i];
-      s.y+=s.vy;if(s.y>H)s.y=0;
-      ctx.globalAlpha=s.o;
-      ctx.fillStyle='rgba(0,255,100,.6)';
-      ctx.fillRect(Math.round(s.x),Math.round(s.y),Math.round(s.r*2),Math.round(s.r*2));
-    }
-    ctx.globalAlpha=1;
-    ctx.fillStyle='rgba(0,255,100,.12)';
-    ctx.fillRect(0,H-14,W,3);
-    ctx.strokeStyle='rgba(0,255,100,.03)';ctx.lineWidth=1;
-    for(var gx=0;gx<W;gx+=64){ctx.beginPath();ctx.moveTo(gx,0);ctx.lineTo(gx,H);ctx.stroke();}
-    for(var gy=0;gy<H;gy+=64){ctx.beginPath();ctx.moveTo(0,gy);ctx.lineTo(W,gy);ctx.stroke();}
-  }
-
-  function overlay(t1,t2){
-    ctx.fillStyle='rgba(0,0,0,.65)';ctx.fillRect(0,0,W,H);
-    ctx.shadowBlur=24;ctx.shadowColor='#00ff99';
-    ctx.fillStyle='#00ff99';
-    ctx.font='bold 26px Orbitron,monospace';
-    ctx.textAlign='center';
-    ctx.fillText(t1,W/2,H/2-16);
-    ctx.shadowBlur=0;
-    ctx.fillStyle='rgba(0,255,100,.7)';
-    ctx.font='13px Orbitron,monospace';
-    ctx.fillText(t2,W/2,H/2+18);
-    ctx.textAlign='left';
-  }
-
-  function loop(){
-    requestAnimationFrame(loop);
-    ctx.fillStyle='#030f03';ctx.fillRect(0,0,W,H);
-    drawBG();
-
-    if(state==='idle'){overlay('PLANT DEFENDER','CLICK START TO PLAY');return;}
-    if(state==='dead'){overlay('GAME OVER','SCORE: '+score+' | CLICK RESTART');return;}
-    if(state==='win') {overlay('YOU WIN!','FINAL SCORE: '+score+' — AMAZING!');return;}
-    if(state==='lvlup'){overlay('LEVEL UP!','GET READY...');return;}
-
-    frame++;
-    cooldown=Math.max(0,cooldown-1);
-    var cfg=LEVELS[lvl];
-
-    // move player
-    if(keys['ArrowLeft']||keys['a']||keys['A']) player.x=Math.max(0,player.x-player.spd);
-    if(keys['ArrowRight']||keys['d']||keys['D']) player.x=Math.min(W-player.w,player.x+player.spd);
-
-    // shoot
-    if((keys['ArrowUp']||keys[' ']||keys['w']||keys['W'])&&cooldown===0){
-      bullets.push({x:player.x+11,y:player.y-4,spd:7});
-      cooldown=cfg.frate;
-    }
-
-    // move player bullets
-    for(var i=bullets.length-1;i>=0;i--){
-      bullets[i].y-=bullets[i].spd;
-      if(bullets[i].y<-10)bullets.splice(i,1);
-    }
-
-    // move bugs
-    var alive=bugs.filter(function(b){return b.alive;});
-    var edge=false;
-    for(var i=0;i<alive.length;i++){
-      alive[i].x+=bugDir*cfg.spd;
-      if(alive[i].x+alive[i].w>=W-18||alive[i].x<=18)edge=true;
-    }
-    if(edge){
-      bugDir*=-1;
-      for(var i=0;i<alive.length;i++) alive[i].y+=12;
-    }
-
-    // bug shooting logic
-    for(var i=0;i<alive.length;i++){
-      var b=alive[i];
-      b.stimer--;
-      if(b.stimer<=0){
-        b.ebullets.push({x:b.x+7,y:b.y+b.h,spd:2+lvl*.5});
-        b.stimer=70+Math.floor(Math.random()*70)-lvl*8;
-      }
-      for(var j=b.ebullets.length-1;j>=0;j--){
-        b.ebullets[j].y+=b.ebullets[j].spd;
-        if(b.ebullets[j].y>H){b.ebullets.splice(j,1);continue;}
-        var eb=b.ebullets[j];
-        if(eb.x>player.x&&eb.x<player.x+player.w&&eb.y>player.y&&eb.y<player.y+player.h){
-          spawnFX(player.x+12,player.y+10,'#ff3333',12);
-          b.ebullets.splice(j,1);
-          lives--;hud();
-          if(lives<=0)state='dead';
-        }
-      }
-      if(b.y+b.h>=H-18)state='dead';
-    }
-
-    // player bullet vs bug
-    outer:
-    for(var bi=bullets.length-1;bi>=0;bi--){
-      for(var gi=0;gi<bugs.length;gi++){
-        var g=bugs[gi];
-        if(!g.alive)continue;
-        var bul=bullets[bi];
-        if(bul&&bul.x>g.x&&bul.x<g.x+g.w&&bul.y>g.y&&bul.y<g.y+g.h){
-          g.alive=false;
-          bullets.splice(bi,1);
-          score+=(lvl+1)*10;kills++;
-          spawnFX(g.x+9,g.y+7,BUGCOLS[g.row%3],10);
-          hud();
-          continue outer;
-        }
-      }
-    }
-
-    // check level done
-    if(kills>=cfg.total){
-      if(lvl<2){
-        state='lvlup';
-        setTimeout(function(){lvl++;initGame();state='playing';hud();},2000);
-      }else{state='win';}
-    }
-
-    // draw everything
-    for(var i=0;i<bugs.length;i++){
-      drawBug(bugs[i]);
-      for(var j=0;j<bugs[i].ebullets.length;j++) drawEBullet(bugs[i].ebullets[j]);
-    }
-    for(var i=0;i<bullets.length;i++) drawBullet(bullets[i]);
-    drawFX();
-    drawPlayer(player);
-
-    // HUD bar at bottom
-    ctx.fillStyle='rgba(0,255,100,.08)';ctx.fillRect(0,H-14,W,14);
-    ctx.fillStyle='#00ff99';ctx.font='9px Orbitron,monospace';
-    ctx.fillText('SCORE:'+score+'  LIVES:'+lives+'  LEVEL:'+(lvl+1),10,H-3);
-  }
-
-  // Key listeners — attached to the document inside the iframe
-  document.addEventListener('keydown',function(e){
-    keys[e.key]=true;
-    if(e.key===' ')e.preventDefault();
-  });
-  document.addEventListener('keyup',function(e){keys[e.key]=false;});
-
-  // Also support clicking canvas to focus it for key events
-  canvas.addEventListener('click', function(){ canvas.focus(); });
-
-  window.startGame=function(){score=0;lives=3;lvl=0;kills=0;initGame();state='playing';hud();};
-  window.restartGame=function(){score=0;lives=3;lvl=0;kills=0;initGame();state='playing';hud();};
-
-  initGame();
-  loop();
-})();
-</script>
-</body>
-</html>
-""", height=560, scrolling=False)
+    if INLINE_ASSETS:
+        components.html(inline_asset("game.html"), height=560, scrolling=False)
+    else:
+        components.iframe(asset_url("game.html"), height=560, scrolling=False)
 
 # ═══════════════════════════════════════
 #  DEV
@@ -0,0 +1,320 @@
+import io
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import statistics
+import numpy as np
+from PIL import Image
+
+# benchmarks are CPU-only so numbers are comparable between machines/runs
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import inference
+import recommendations
+from near_duplicate import NearDuplicateIndex, dhash
+from similarity import EmbeddingIndex
+from history import PredictionHistory, top_k
+from validation import validate
+from leaf_crop import crop_to_leaf, leaf_bbox
+from inference import IMG_SIZE, generate_cache_key, load_and_preprocess_image, preprocess_into
+
+# ─────────────────────────────────────────────
+#  Inference hot-path benchmark suite
+#
+#  python benchmark.py --out new.json --compare old.json
+#
+#  Each registered function yields (name, callable, items_per_call); the
+#  runner times every callable with timeit and stores per-call statistics.
+#  Functions are registered under the group prefix of the names they yield,
+#  so `-k group/...` skips the set-up of every other group.
+# ─────────────────────────────────────────────
+ROOT      = os.path.dirname(os.path.abspath(__file__))
+SIZES     = (256, 1024, 3000)
+FORMATS   = ("JPEG", "PNG")
+BENCHES   = []
+
+def bench(group):
+    def register(fn):
+        BENCHES.append((group, fn))
+        return fn
+    return register
+
+def wanted(group, selected):
+    # a selector naming another group ("cache_key/md5") rules this one out;
+    # a bare substring ("md5") can't, so the group still has to be set up
+    return not selected or any("/" not in s or s.split("/", 1)[0] == group for s in selected)
+
+def synthetic_leaf(size, seed=0):
+    # smooth green gradient plus noise: compresses like a photo, not like a flat fill
+    rng  = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    rgb  = np.stack([60 + 80 * x, 120 + 100 * y, 40 + 60 * x * y], axis=-1)
+    rgb += rng.normal(0, 12, rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), "RGB")
+
+def encode(image, fmt):
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, quality=90) if fmt == "JPEG" else image.save(buf, format=fmt)
+    return buf.getvalue()
+
+class Context:
+    def __init__(self, model_file, class_indices_file):
+        self.images     = {s: synthetic_leaf(s, seed=s) for s in SIZES}
+        self.blobs      = {(f, s): encode(img, f) for s, img in self.images.items() for f in FORMATS}
+        self.test_blobs = [open(os.path.join(ROOT, "test_images", f), "rb").read()
+                           for f in sorted(os.listdir(os.path.join(ROOT, "test_images")))]
+        self.model_file = model_file
+        self.class_indices_file = class_indices_file
+        self._model     = None
+
+    @property
+    def class_indices(self):
+        if os.path.exists(self.class_indices_file):
+            return inference.load_class_indices(self.class_indices_file)
+        return {str(i): f"class_{i}" for i in range(38)}
+
+    @property
+    def model(self):
+        if self._model is None:
+            if os.path.exists(self.model_file):
+                self._model = inference.load_model(self.model_file)
+            else:
+                # no trained weights in the checkout: same architecture, random weights
+                self._model = inference.build_model(len(self.class_indices))
+        return self._model
+
+    def saved_model_file(self):
+        if os.path.exists(self.model_file):
+            return self.model_file
+        path = os.path.join(tempfile.mkdtemp(), "bench_model.h5")
+        self.model.save(path)
+        return path
+
+def _decode(blob):
+    img = Image.open(io.BytesIO(blob))
+    img.load()
+    return img
+
+# ─────────────────────────────────────────────
+#  Benchmarks
+# ─────────────────────────────────────────────
+@bench("decode")
+def decode(ctx):
+    for (fmt, size), blob in ctx.blobs.items():
+        yield f"decode/{fmt.lower()}/{size}", lambda b=blob: _decode(b), 1
+    yield "decode/test_images", lambda: [_decode(b) for b in ctx.test_blobs], len(ctx.test_blobs)
+
+@bench("preprocess")
+def preprocess(ctx):
+    out = np.empty(IMG_SIZE + (3,), dtype=np.float32)
+    for size, img in ctx.images.items():
+        yield f"preprocess/load_and_preprocess/{size}", lambda i=img: load_and_preprocess_image(i), 1
+        yield f"preprocess/preprocess_into/{size}", lambda i=img: preprocess_into(i, out), 1
+        yield f"preprocess/leaf_bbox/{size}", lambda i=img: leaf_bbox(i), 1
+        yield f"preprocess/crop_then_preprocess/{size}", lambda i=img: preprocess_into(crop_to_leaf(i), out), 1
+
+@bench("cache_key")
+def cache_key(ctx):
+    for size, img in ctx.images.items():
+        yield f"cache_key/md5/{size}", lambda i=img: generate_cache_key(i), 1
+        yield f"cache_key/dhash/{size}", lambda i=img: dhash(i), 1
+    index = NearDuplicateIndex(max_distance=6)
+    rng   = np.random.default_rng(0)
+    for h in rng.integers(0, 2**63, size=10_000, dtype=np.int64):
+        index.add(int(h), "x")
+    probe = int(rng.integers(0, 2**63, dtype=np.int64))
+    yield "cache_key/near_duplicate_lookup_10k", lambda: index.lookup(probe), 1
+
+@bench("predict")
+def predict(ctx):
+    model = ctx.model
+    x1    = load_and_preprocess_image(ctx.images[256])
+    x32   = np.repeat(x1, 32, axis=0)
+    model.predict(x1, verbose=0)   # build the predict function outside the timed region
+    yield "predict/single", lambda: model.predict(x1, verbose=0), 1
+    yield "predict/batch32", lambda: model.predict(x32, verbose=0), 32
+    yield "predict/single_direct_call", lambda: model(x1, training=False), 1
+    inference.predict_with_embedding(model, x1)
+    yield "predict/single_with_embedding", lambda: inference.predict_with_embedding(model, x1), 1
+
+@bench("model")
+def model_load(ctx):
+    path = ctx.saved_model_file()
+    yield "model/cold_load", lambda: inference.load_model(path), 1
+
+@bench("e2e")
+def end_to_end(ctx):
+    # mirrors the Demo's predict_image_class path with default settings:
+    # validate -> md5 -> history -> dHash lookup -> predict -> record ->
+    # knowledge-base advice (leaf crop is opt-in; see preprocess/crop_*)
+    model         = ctx.model
+    class_indices = ctx.class_indices
+    index         = NearDuplicateIndex(max_distance=6)
+    rng           = np.random.default_rng(0)
+    for h in rng.integers(0, 2**63, size=10_000, dtype=np.int64):
+        index.add(int(h), ([0], [1.0]))
+
+    def make_history():
+        history = PredictionHistory(spill_dir=tempfile.mkdtemp(), chunk_rows=4096, max_chunks=64)
+        for _ in range(10_000):
+            history.append("bench", os.urandom(16).hex(), [0, 1, 2], [.5, .3, .2], 1.0)
+        return history
+    model.predict(load_and_preprocess_image(ctx.images[256]), verbose=0)
+
+    def run(history, blob, record_as=None):
+        t0    = time.perf_counter()
+        image = validate(blob)
+        ck    = generate_cache_key(image)
+        prev  = history.latest(ck)
+        if prev is not None:
+            topk_idx = prev["topk_idx"]
+        else:
+            ph = dhash(image)
+            index.lookup(ph)
+            preds = model.predict(load_and_preprocess_image(image), verbose=0)
+            topk_idx, topk_prob = top_k(preds[0])
+            # a fresh key keeps every timed call on the miss path
+            history.append("bench", record_as or os.urandom(16).hex(), topk_idx, topk_prob,
+                           (time.perf_counter() - t0) * 1000)
+        name = class_indices.get(str(int(topk_idx[0])), "Unknown class")
+        return recommendations.cached_or_static_recommendations(name)
+
+    misses = make_history()
+    for size in (1024, 3000):
+        yield f"e2e/jpeg{size}_miss", lambda b=ctx.blobs[("JPEG", size)]: run(misses, b), 1
+    hits = make_history()
+    blob = ctx.blobs[("JPEG", 1024)]
+    run(hits, blob, record_as=generate_cache_key(validate(blob)))
+    yield "e2e/jpeg1024_history_hit", lambda: run(hits, blob), 1
+
+@bench("recommendations")
+def knowledge_base(ctx):
+    recommendations.knowledge_base()
+    yield "recommendations/kb_lookup", lambda: recommendations.cached_or_static_recommendations("Tomato___Late_blight"), 1
+    yield "recommendations/kb_cold_load", lambda: recommendations.load_knowledge_base(), 1
+
+@bench("similar")
+def similar_cases(ctx):
+    rng   = np.random.default_rng(0)
+    vecs  = np.maximum(rng.normal(size=(50_000, 128)), 0).astype(np.float32)
+    brute = EmbeddingIndex(vecs)
+    ivf   = EmbeddingIndex(vecs, n_lists=64)
+    q     = vecs[0]
+    brute.search(q)
+    ivf.search(q)
+    yield "similar/build_brute_50k", lambda: EmbeddingIndex(vecs), 1
+    yield "similar/query_brute_50k", lambda: brute.search(q), 1
+    yield "similar/query_ivf64_50k", lambda: ivf.search(q), 1
+
+# ─────────────────────────────────────────────
+#  Runner
+# ─────────────────────────────────────────────
+def measure(fn, repeat, min_time):
+    timer  = timeit.Timer(fn)
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if t == 0 else max(2, int(min_time / t) + 1)
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return number, times
+
+def run_all(ctx, selected, repeat, min_time):
+    results = {}
+    for group, fn in BENCHES:
+        if not wanted(group, selected):
+            continue
+        try:
+            cases = list(fn(ctx))
+        except ImportError as e:
+            print(f"skip {fn.__name__}: {e}", file=sys.stderr)
+            continue
+        for name, call, items in cases:
+            if selected and not any(s in name for s in selected):
+                continue
+            number, times = measure(call, repeat, min_time if not name.startswith("model/") else 0)
+            med = statistics.median(times)
+            results[name] = {
+                "median_ms":   round(med * 1e3, 4),
+                "min_ms":      round(min(times) * 1e3, 4),
+                "mean_ms":     round(statistics.fmean(times) * 1e3, 4),
+                "stdev_ms":    round(statistics.pstdev(times) * 1e3, 4),
+                "per_item_ms": round(med * 1e3 / items, 4),
+                "number":      number,
+                "repeat":      repeat,
+            }
+            print(f"{name:42s} {results[name]['median_ms']:10.3f} ms  "
+                  f"({results[name]['per_item_ms']:.3f} ms/item)", file=sys.stderr)
+    return results
+
+def compare(new, old, threshold):
+    regressions = []
+    print(f"\n{'benchmark':42s} {'old ms':>10s} {'new ms':>10s} {'ratio':>7s}")
+    for name, res in new["results"].items():
+        prev = old["results"].get(name)
+        if prev is None:
+            continue
+        ratio = res["median_ms"] / prev["median_ms"] if prev["median_ms"] else float("inf")
+        flag  = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:42s} {prev['median_ms']:10.3f} {res['median_ms']:10.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inference hot path (CPU, offline)")
+    parser.add_argument("-k", dest="select", action="append", default=[],
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--model", default=inference.model_path)
+    parser.add_argument("--class-indices", default=inference.class_indices_path)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing repeat")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="previous results JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    ctx    = Context(args.model, args.class_indices)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python":    platform.python_version(),
+            "machine":   platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "numpy":     np.__version__,
+            "pillow":    Image.__version__,
+        },
+        "results": run_all(ctx, args.select, args.repeat, args.min_time),
+    }
+    try:
+        import tensorflow as tf
+        report["meta"]["tensorflow"] = tf.__version__
+    except ImportError:
+        pass
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results -> {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+from inference import IMG_SIZE, preprocess_into, load_model, load_class_indices, model_path, class_indices_path
+from leaf_crop import crop_to_leaf
+
+# ─────────────────────────────────────────────
+#  Evaluation harness
+#  Streams a PlantVillage-style folder (one sub-folder per class label from
+#  class_indices.json) through batched prediction and reports a confusion
+#  matrix, per-class precision/recall and throughput.
+# ─────────────────────────────────────────────
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+def iter_labeled_images(data_dir, class_indices):
+    label_to_idx = {name: int(idx) for idx, name in class_indices.items()}
+    for label in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        if label not in label_to_idx:
+            print(f"skipping unknown class folder: {label}", file=sys.stderr)
+            continue
+        for fname in sorted(os.listdir(folder)):
+            if fname.lower().endswith(IMAGE_EXTS):
+                yield os.path.join(folder, fname), label_to_idx[label]
+
+def iter_batches(samples, batch_size, crop_leaf=False):
+    buf    = np.empty((batch_size,) + IMG_SIZE + (3,), dtype=np.float32)
+    labels = []
+    n      = 0
+    for path, label in samples:
+        try:
+            with Image.open(path) as img:
+                preprocess_into(crop_to_leaf(img) if crop_leaf else img, buf[n])
+        except Exception as e:
+            print(f"unreadable image {path}: {e}", file=sys.stderr)
+            continue
+        labels.append(label)
+        n += 1
+        if n == batch_size:
+            yield buf, np.asarray(labels)
+            labels, n = [], 0
+    if n:
+        yield buf[:n], np.asarray(labels)
+
+def confusion_matrix(y_true, y_pred, n_classes):
+    flat = y_true.astype(np.int64) * n_classes + y_pred.astype(np.int64)
+    return np.bincount(flat, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+def per_class_metrics(cm, class_indices):
+    tp        = np.diag(cm).astype(np.float64)
+    support   = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall    = np.where(support > 0, tp / support, 0.0)
+        f1        = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {
+        class_indices.get(str(i), str(i)): {
+            "precision": round(float(precision[i]), 4),
+            "recall":    round(float(recall[i]), 4),
+            "f1":        round(float(f1[i]), 4),
+            "support":   int(support[i]),
+        }
+        for i in range(cm.shape[0])
+    }
+
+def evaluate(model, data_dir, class_indices, batch_size=32, crop_leaf=False):
+    n_classes = len(class_indices)
+    cm        = np.zeros((n_classes, n_classes), dtype=np.int64)
+    batches   = []
+    t_start   = time.perf_counter()
+    t_prev    = t_start
+    samples = iter_labeled_images(data_dir, class_indices)
+    for batch, labels in iter_batches(samples, batch_size, crop_leaf):
+        t0    = time.perf_counter()
+        preds = np.argmax(model.predict(batch, verbose=0), axis=1)
+        t1    = time.perf_counter()
+        cm   += confusion_matrix(labels, preds, n_classes)
+        batches.append({
+            "size":              len(labels),
+            "load_seconds":      round(t0 - t_prev, 5),
+            "predict_seconds":   round(t1 - t0, 5),
+            "images_per_sec":    round(len(labels) / max(t1 - t_prev, 1e-9), 2),
+        })
+        t_prev = t1
+    elapsed = time.perf_counter() - t_start
+    total   = int(cm.sum())
+    return {
+        "images":           total,
+        "accuracy":         round(float(np.trace(cm)) / total, 4) if total else 0.0,
+        "images_per_sec":   round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "seconds":          round(elapsed, 3),
+        "batch_size":       batch_size,
+        "crop_leaf":        crop_leaf,
+        "per_class":        per_class_metrics(cm, class_indices),
+        "batches":          batches,
+        "confusion_matrix": cm.tolist(),
+    }
+
+def check_regression(report, baseline, acc_tol=0.01, speed_tol=0.10):
+    failures = []
+    if report["accuracy"] < baseline["accuracy"] - acc_tol:
+        failures.append(f"accuracy {report['accuracy']:.4f} < baseline {baseline['accuracy']:.4f} - {acc_tol}")
+    floor = baseline["images_per_sec"] * (1 - speed_tol)
+    if report["images_per_sec"] < floor:
+        failures.append(f"images/sec {report['images_per_sec']:.1f} < {floor:.1f} "
+                        f"(baseline {baseline['images_per_sec']:.1f} - {speed_tol:.0%})")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the plant disease model on a labeled folder")
+    parser.add_argument("data_dir", help="folder with one sub-folder per class label")
+    parser.add_argument("--model", default=model_path)
+    parser.add_argument("--class-indices", default=class_indices_path)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--crop-leaf", action="store_true", help="crop to the detected leaf before resizing")
+    parser.add_argument("--compare-crop", action="store_true",
+                        help="evaluate without and with --crop-leaf; fail if cropping costs more than --acc-tol")
+    parser.add_argument("--out", default="eval_report.json")
+    parser.add_argument("--baseline", default=None, help="previous report to compare against")
+    parser.add_argument("--acc-tol", type=float, default=0.01, help="allowed absolute accuracy drop")
+    parser.add_argument("--speed-tol", type=float, default=0.10, help="allowed relative images/sec drop")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the report to --baseline")
+    args = parser.parse_args(argv)
+
+    class_indices = load_class_indices(args.class_indices)
+    if args.compare_crop:
+        model  = load_model(args.model)
+        plain  = evaluate(model, args.data_dir, class_indices, args.batch, crop_leaf=False)
+        crop   = evaluate(model, args.data_dir, class_indices, args.batch, crop_leaf=True)
+        delta  = crop["accuracy"] - plain["accuracy"]
+        with open(args.out, "w") as f:
+            json.dump({"no_crop": plain, "crop_leaf": crop, "accuracy_delta": round(delta, 4)}, f, indent=2)
+        print(f"accuracy no crop={plain['accuracy']:.4f}  crop={crop['accuracy']:.4f}  "
+              f"delta={delta:+.4f}  images={plain['images']}  -> {args.out}")
+        return 1 if delta < -args.acc_tol else 0
+
+    report        = evaluate(load_model(args.model), args.data_dir, class_indices, args.batch, args.crop_leaf)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"accuracy={report['accuracy']:.4f}  images/sec={report['images_per_sec']:.1f}  "
+          f"images={report['images']}  -> {args.out}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regression(report, json.load(f), args.acc_tol, args.speed_tol)
+        for msg in failures:
+            print(f"REGRESSION: {msg}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+from inference import IMG_SIZE, preprocess_into, load_model, load_class_indices, model_path, class_indices_path
+from leaf_crop import crop_to_leaf
+
+# ─────────────────────────────────────────────
+#  Incremental fine-tuning from field images
+#
+#  python finetune.py field_images/ --replay "plantvillage dataset/color" --epochs 5
+#
+#  The conv layers up to --freeze-until stay frozen.  Their activations are
+#  computed once per image and kept in an on-disk float16 feature cache keyed
+#  by image content and by the frozen weights, so later retrains only run the
+#  dense head.  Each run writes trained_model/versions/vNNN/ with the full
+#  model, its class_indices.json and a metadata.json.
+# ─────────────────────────────────────────────
+ROOT         = os.path.dirname(os.path.abspath(__file__))
+VERSIONS_DIR = os.path.join(ROOT, "trained_model", "versions")
+CACHE_DIR    = os.path.join(ROOT, "feature_cache")
+IMAGE_EXTS   = (".jpg", ".jpeg", ".png")
+
+def list_labeled_images(data_dir, limit_per_class=None):
+    samples = []
+    for label in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTS))
+        samples += [(os.path.join(folder, f), label) for f in files[:limit_per_class]]
+    return samples
+
+def file_key(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+# ─────────────────────────────────────────────
+#  Feature cache
+# ─────────────────────────────────────────────
+class FeatureCache:
+    def __init__(self, root, model_key, dim):
+        self.dir        = os.path.join(root, model_key)
+        self.dim        = dim
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.data_path  = os.path.join(self.dir, "features.f16")
+        os.makedirs(self.dir, exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def __len__(self):
+        return len(self.index)
+
+    def rows(self, keys):
+        return np.array([self.index.get(k, -1) for k in keys], dtype=np.int64)
+
+    @property
+    def row_bytes(self):
+        return self.dim * np.dtype(np.float16).itemsize
+
+    def add(self, keys, features):
+        # one row per new key; the offset comes from the data file itself, so
+        # rows orphaned by a crash before the index write can't shift later keys
+        features = np.ascontiguousarray(features, dtype=np.float16).reshape(len(keys), self.dim)
+        fresh    = {}
+        for i, k in enumerate(keys):
+            if k not in self.index and k not in fresh:
+                fresh[k] = i
+        if not fresh:
+            return
+        with open(self.data_path, "ab") as f:
+            size  = f.tell()
+            start = size // self.row_bytes
+            if size % self.row_bytes:
+                f.truncate(start * self.row_bytes)      # drop a half-written row
+            f.write(features[list(fresh.values())].tobytes())
+        for j, k in enumerate(fresh):
+            self.index[k] = start + j
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def load(self, rows):
+        n    = os.path.getsize(self.data_path) // self.row_bytes
+        data = np.memmap(self.data_path, dtype=np.float16, mode="r", shape=(n, self.dim))
+        return np.asarray(data[rows], dtype=np.float32)
+
+def frozen_key(model, freeze_until, crop_leaf):
+    h = hashlib.sha256(f"{freeze_until}|crop={crop_leaf}".encode())
+    for layer in model.layers:
+        for w in layer.get_weights():
+            h.update(np.ascontiguousarray(w).tobytes())
+        if layer.name == freeze_until:
+            break
+    return h.hexdigest()[:16]
+
+def extract_features(samples, keys, extractor, cache, batch_size, crop_leaf):
+    # identical images (e.g. a field image also in --replay) are extracted once
+    missing, seen = [], set()
+    for i, (k, r) in enumerate(zip(keys, cache.rows(keys))):
+        if r < 0 and k not in seen:
+            seen.add(k)
+            missing.append(i)
+    buf     = np.empty((batch_size,) + IMG_SIZE + (3,), dtype=np.float32)
+    bad     = set()
+    t0      = time.perf_counter()
+    for start in range(0, len(missing), batch_size):
+        ok = []
+        for i in missing[start:start + batch_size]:
+            try:
+                with Image.open(samples[i][0]) as img:
+                    preprocess_into(crop_to_leaf(img) if crop_leaf else img, buf[len(ok)])
+            except Exception as e:
+                print(f"unreadable image {samples[i][0]}: {e}", file=sys.stderr)
+                bad.add(keys[i])
+                continue
+            ok.append(i)
+        if ok:
+            feats = extractor.predict(buf[:len(ok)], verbose=0)
+            cache.add([keys[i] for i in ok], feats.reshape(len(ok), -1))
+    return len(missing) - len(bad), time.perf_counter() - t0, bad
+
+# ─────────────────────────────────────────────
+#  Model surgery
+# ─────────────────────────────────────────────
+def split_model(model, freeze_until):
+    import tensorflow as tf
+    names = [l.name for l in model.layers]
+    if freeze_until not in names:
+        raise ValueError(f"no layer named {freeze_until!r}; layers are {names}")
+    cut       = names.index(freeze_until) + 1
+    extractor = tf.keras.Model(model.inputs, model.layers[cut - 1].output)
+    return extractor, model.layers[:cut], model.layers[cut:]
+
+def build_head(head_layers, feature_dim, n_classes, n_old_classes):
+    import tensorflow as tf
+    inputs = tf.keras.Input(shape=(feature_dim,))
+    x      = inputs
+    for layer in head_layers[:-1]:
+        clone = layer.__class__.from_config(layer.get_config())
+        x     = clone(x)
+        clone.set_weights(layer.get_weights())
+    last  = head_layers[-1]
+    cfg   = last.get_config()
+    cfg["units"] = n_classes
+    out   = last.__class__.from_config(cfg)
+    y     = out(x)
+    # keep the trained weights for existing classes, small random init for new ones
+    w, b          = last.get_weights()
+    new_w, new_b  = out.get_weights()
+    new_w[:, :n_old_classes] = w
+    new_b[:n_old_classes]    = b
+    out.set_weights([new_w, new_b])
+    return tf.keras.Model(inputs, y)
+
+def assemble(frozen_layers, head, input_shape):
+    import tensorflow as tf
+    model = tf.keras.Sequential([tf.keras.Input(shape=input_shape)])
+    for layer in frozen_layers:
+        model.add(layer)
+    for layer in head.layers[1:]:
+        model.add(layer)
+    return model
+
+def next_version_dir(versions_dir):
+    os.makedirs(versions_dir, exist_ok=True)
+    existing = [int(d[1:]) for d in os.listdir(versions_dir) if d.startswith("v") and d[1:].isdigit()]
+    return os.path.join(versions_dir, f"v{max(existing, default=0) + 1:03d}")
+
+# ─────────────────────────────────────────────
+#  Main
+# ─────────────────────────────────────────────
+def finetune(args):
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(args.seed)
+
+    base          = load_model(args.base_model)
+    class_indices = load_class_indices(args.class_indices)
+    labels        = [class_indices[str(i)] for i in range(len(class_indices))]
+
+    samples = list_labeled_images(args.data_dir)
+    if args.replay:
+        samples += list_labeled_images(args.replay, args.replay_per_class)
+    if not samples:
+        raise SystemExit(f"no labeled images under {args.data_dir}")
+
+    extractor, frozen, head_layers = split_model(base, args.freeze_until)
+    feature_dim = int(np.prod(extractor.output_shape[1:]))
+    cache       = FeatureCache(args.cache_dir, frozen_key(base, args.freeze_until, args.crop_leaf), feature_dim)
+    keys        = [file_key(p) for p, _ in samples]
+    n_new, secs, bad = extract_features(samples, keys, extractor, cache, args.batch, args.crop_leaf)
+    if bad:
+        kept    = [i for i, k in enumerate(keys) if k not in bad]
+        print(f"skipping {len(samples) - len(kept)} unreadable images", file=sys.stderr)
+        samples = [samples[i] for i in kept]
+        keys    = [keys[i] for i in kept]
+        if not samples:
+            raise SystemExit(f"no readable images under {args.data_dir}")
+    print(f"features: {n_new} computed in {secs:.1f}s, {len(samples) - n_new} from cache", file=sys.stderr)
+    for label in sorted({lbl for _, lbl in samples} - set(labels)):
+        print(f"new class: {label}", file=sys.stderr)
+        labels.append(label)
+    label_idx = {lbl: i for i, lbl in enumerate(labels)}
+
+    X = cache.load(cache.rows(keys))
+    y = np.array([label_idx[lbl] for _, lbl in samples])
+    rng   = np.random.default_rng(args.seed)
+    order = rng.permutation(len(y))
+    n_val = int(len(y) * args.val_split)
+    val, train = order[:n_val], order[n_val:]
+
+    head = build_head(head_layers, feature_dim, len(labels), len(class_indices))
+    head.compile(optimizer=tf.keras.optimizers.Adam(args.lr),
+                 loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    t0   = time.perf_counter()
+    hist = head.fit(X[train], y[train], epochs=args.epochs, batch_size=args.batch,
+                    validation_data=(X[val], y[val]) if n_val else None, verbose=2)
+    train_secs = time.perf_counter() - t0
+
+    for layer in frozen:
+        layer.trainable = False
+    model = assemble(frozen, head, base.input_shape[1:])
+    model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+    out_dir = next_version_dir(args.versions_dir)
+    os.makedirs(out_dir)
+    model.save(os.path.join(out_dir, "plant_disease_prediction_model.h5"))
+    with open(os.path.join(out_dir, "class_indices.json"), "w") as f:
+        json.dump({str(i): lbl for i, lbl in enumerate(labels)}, f)
+    meta = {
+        "version":         os.path.basename(out_dir),
+        "parent_model":    os.path.abspath(args.base_model),
+        "created":         time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "freeze_until":    args.freeze_until,
+        "crop_leaf":       args.crop_leaf,
+        "images":          len(samples),
+        "new_classes":     labels[len(class_indices):],
+        "features_cached": len(samples) - n_new,
+        "head_train_seconds": round(train_secs, 2),
+        "history":         {k: [round(float(v), 4) for v in vals] for k, vals in hist.history.items()},
+    }
+    with open(os.path.join(out_dir, "metadata.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"saved {out_dir}", file=sys.stderr)
+    return out_dir
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fine-tune the plant disease model on new field images")
+    parser.add_argument("data_dir", help="new labeled images, one sub-folder per class label")
+    parser.add_argument("--base-model", default=model_path)
+    parser.add_argument("--class-indices", default=class_indices_path)
+    parser.add_argument("--replay", default=None, help="original dataset folder mixed in to limit forgetting")
+    parser.add_argument("--replay-per-class", type=int, default=50)
+    parser.add_argument("--freeze-until", default="flatten", help="last frozen layer name")
+    parser.add_argument("--crop-leaf", action="store_true")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--val-split", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--versions-dir", default=VERSIONS_DIR)
+    args = parser.parse_args(argv)
+    finetune(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import os
+import glob
+import time
+import hashlib
+import threading
+import numpy as np
+
+# ─────────────────────────────────────────────
+#  Prediction history
+#
+#  Append-only columnar log held in a NumPy structured array.  When the
+#  in-memory chunk fills up it is written to disk as a .npy file and read
+#  back memory-mapped for queries, so resident memory stays at one chunk.
+# ─────────────────────────────────────────────
+TOP_K = 3
+
+RECORD_DTYPE = np.dtype([
+    ("ts",         "f8"),
+    ("session",    "u8"),
+    ("model",      "u8"),               # model_key() of the weights that answered; 0 = unknown
+    ("image_hash", "S16"),              # raw MD5 digest from generate_cache_key
+    ("class_idx",  "i2"),
+    ("topk_idx",   "i2", (TOP_K,)),
+    ("topk_prob",  "f2", (TOP_K,)),
+    ("latency_ms", "f4"),
+    ("source",     "u1"),
+])
+
+SOURCES      = ("model", "server", "near_duplicate", "history")
+SOURCE_CODES = {name: i for i, name in enumerate(SOURCES)}
+
+def session_key(session_id):
+    return int.from_bytes(hashlib.blake2b(session_id.encode(), digest_size=8).digest(), "big")
+
+def model_key(model_id):
+    return session_key(model_id) if model_id else 0
+
+def top_k(probs, k=TOP_K):
+    probs = np.asarray(probs, dtype=np.float32).ravel()
+    idx   = np.argpartition(-probs, min(k, probs.size) - 1)[:k]
+    idx   = idx[np.argsort(-probs[idx])]
+    return idx, probs[idx]
+
+class PredictionHistory:
+    def __init__(self, spill_dir=None, chunk_rows=4096, max_chunks=None):
+        self.spill_dir  = spill_dir
+        self.chunk_rows = chunk_rows
+        self.max_chunks = max_chunks
+        self._live      = np.zeros(chunk_rows, dtype=RECORD_DTYPE)
+        self._n         = 0
+        self._lock      = threading.Lock()
+        self._spilled   = []
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spilled = sorted(glob.glob(os.path.join(spill_dir, "history_*.npy")))
+
+    def __len__(self):
+        spilled = sum(np.load(p, mmap_mode="r").shape[0] for p in self._spilled)
+        return spilled + self._n
+
+    @property
+    def nbytes_in_memory(self):
+        return self._live.nbytes
+
+    def append(self, session_id, image_hash, topk_idx, topk_prob, latency_ms, source="model", model_id=None):
+        with self._lock:
+            if self._n == self.chunk_rows:
+                self._spill()
+            rec = self._live[self._n]
+            k   = min(len(topk_idx), TOP_K)
+            rec["ts"]         = time.time()
+            rec["session"]    = session_key(session_id)
+            rec["model"]      = model_key(model_id)
+            rec["image_hash"] = bytes.fromhex(image_hash)
+            rec["class_idx"]  = topk_idx[0]
+            rec["topk_idx"]   = -1
+            rec["topk_idx"][:k]  = topk_idx[:k]
+            rec["topk_prob"]  = 0
+            rec["topk_prob"][:k] = topk_prob[:k]
+            rec["latency_ms"] = latency_ms
+            rec["source"]     = SOURCE_CODES[source]
+            self._n += 1
+
+    def _spill(self):
+        if not self.spill_dir:
+            # no disk configured: keep a fixed-size ring instead of growing
+            self._live[:-1] = self._live[1:]
+            self._n -= 1
+            return
+        seq  = int(os.path.basename(self._spilled[-1])[8:-4]) + 1 if self._spilled else 0
+        path = os.path.join(self.spill_dir, f"history_{seq:06d}.npy")
+        np.save(path, self._live[:self._n])
+        self._spilled.append(path)
+        self._n = 0
+        if self.max_chunks is not None:
+            while len(self._spilled) > self.max_chunks:
+                os.remove(self._spilled.pop(0))
+
+    def _chunks(self):
+        for path in list(self._spilled):
+            chunk = np.load(path, mmap_mode="r")
+            if chunk.dtype != RECORD_DTYPE:
+                # spilled before a column was added: missing fields read as 0
+                old   = chunk
+                chunk = np.zeros(old.shape, dtype=RECORD_DTYPE)
+                for name in set(old.dtype.names) & set(RECORD_DTYPE.names):
+                    chunk[name] = old[name]
+            yield chunk
+        with self._lock:
+            live = self._live[:self._n].copy()
+        yield live
+
+    def query(self, session_id=None, image_hash=None, since=None, limit=None, model_id=None):
+        sid = session_key(session_id) if session_id is not None else None
+        key = bytes.fromhex(image_hash) if image_hash is not None else None
+        mid = model_key(model_id) if model_id is not None else None
+        out = []
+        for chunk in self._chunks():
+            mask = np.ones(chunk.shape[0], dtype=bool)
+            if sid is not None:
+                mask &= chunk["session"] == sid
+            if key is not None:
+                mask &= chunk["image_hash"] == key
+            if mid is not None:
+                mask &= chunk["model"] == mid
+            if since is not None:
+                mask &= chunk["ts"] >= since
+            if mask.any():
+                out.append(np.asarray(chunk[mask]))
+        rows = np.concatenate(out) if out else np.zeros(0, dtype=RECORD_DTYPE)
+        return rows[-limit:] if limit else rows
+
+    def latest(self, image_hash, session_id=None, model_id=None):
+        rows = self.query(session_id=session_id, image_hash=image_hash, limit=1, model_id=model_id)
+        return rows[0] if len(rows) else None
+
+    def class_counts(self, n_classes, session_id=None):
+        sid    = session_key(session_id) if session_id is not None else None
+        counts = np.zeros(n_classes, dtype=np.int64)
+        for chunk in self._chunks():
+            idx = chunk["class_idx"] if sid is None else chunk["class_idx"][chunk["session"] == sid]
+            idx = idx[(idx >= 0) & (idx < n_classes)]
+            counts += np.bincount(idx, minlength=n_classes)
+        return counts
@@ -0,0 +1,76 @@
+import os
+import json
+import hashlib
+import weakref
+import numpy as np
+
+# ─────────────────────────────────────────────
+#  Shared inference helpers
+#  (imported by app1.py and the offline tools, so keep Streamlit out of here)
+# ─────────────────────────────────────────────
+IMG_SIZE = (128, 128)
+
+working_dir        = os.path.dirname(os.path.abspath(__file__))
+model_path         = os.path.join(working_dir, "trained_model", "plant_disease_prediction_model.h5")
+class_indices_path = os.path.join(working_dir, "class_indices.json")
+
+def load_model(path=model_path):
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
+
+def model_fingerprint(path=model_path):
+    # identifies the weights file, so cached answers from another model aren't reused
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def build_model(num_classes=38, img_size=IMG_SIZE[0]):
+    # architecture from model_training_notebook/ (untrained weights)
+    from tensorflow.keras import layers, models
+    model = models.Sequential()
+    model.add(layers.Conv2D(32, (3, 3), activation="relu", input_shape=(img_size, img_size, 3)))
+    model.add(layers.MaxPooling2D(2, 2))
+    model.add(layers.Conv2D(64, (3, 3), activation="relu"))
+    model.add(layers.MaxPooling2D(2, 2))
+    model.add(layers.Flatten())
+    model.add(layers.Dense(128, activation="relu"))
+    model.add(layers.Dense(num_classes, activation="softmax"))
+    model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    return model
+
+# The penultimate Dense(128) activation doubles as an image embedding for
+# similar-case search; this wraps the classifier so one forward pass returns both.
+_EMBEDDERS = weakref.WeakKeyDictionary()
+
+def embedding_model(model):
+    if model not in _EMBEDDERS:
+        import tensorflow as tf
+        _EMBEDDERS[model] = tf.keras.Model(model.inputs, [model.output, model.layers[-2].output])
+    return _EMBEDDERS[model]
+
+def predict_with_embedding(model, batch):
+    probs, emb = embedding_model(model).predict(batch, verbose=0)
+    return probs, emb
+
+def load_class_indices(path=class_indices_path):
+    with open(path) as f:
+        return json.load(f)
+
+def generate_cache_key(image):
+    return hashlib.md5(image.tobytes()).hexdigest()
+
+def load_and_preprocess_image(image, target_size=IMG_SIZE):
+    img       = image.resize(target_size)
+    img_array = np.array(img)
+    img_array = np.expand_dims(img_array, axis=0)
+    return img_array.astype("float32") / 255.0
+
+def preprocess_into(image, out, target_size=IMG_SIZE):
+    # Same maths as load_and_preprocess_image, but written straight into a
+    # preallocated (H, W, 3) float32 buffer.  RGBA/greyscale uploads are
+    # converted so every slot has exactly three channels.
+    img = image.convert("RGB").resize(target_size)
+    np.divide(np.asarray(img), np.float32(255.0), out=out, dtype=np.float32)
+    return out
@@ -0,0 +1,64 @@
+import numpy as np
+from PIL import Image
+
+# ─────────────────────────────────────────────
+#  Leaf region cropping
+#
+#  Field photos often show a small leaf on a large background, and squashing
+#  the whole frame to 128x128 leaves the model only a few leaf pixels.  This
+#  finds the leaf on a small thumbnail with an HSV colour mask (green through
+#  yellow/brown, so lesions stay inside the box) and crops the full-resolution
+#  image to a square around it, similar to the PlantVillage framing.
+# ─────────────────────────────────────────────
+THUMB_SIZE   = 96
+HUE_RANGE    = (20, 130)     # PIL hue is 0..255: ~28° (brown/yellow) .. ~183° (cyan-green)
+MIN_SAT      = 40
+MIN_VAL      = 35
+MIN_FRACTION = 0.01          # below this the mask is noise: leave the image alone
+MAX_FRACTION = 0.85          # above this the leaf already fills the frame
+
+def leaf_mask(image, thumb_size=THUMB_SIZE):
+    # resize before convert so the full-resolution frame is never copied
+    thumb = image if image.mode in ("RGB", "RGBA", "L") else image.convert("RGB")
+    thumb = thumb.resize(_thumb_dims(image.size, thumb_size), Image.NEAREST, reducing_gap=3.0)
+    hsv   = np.asarray(thumb.convert("RGB").convert("HSV"))
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    return (h >= HUE_RANGE[0]) & (h <= HUE_RANGE[1]) & (s >= MIN_SAT) & (v >= MIN_VAL)
+
+def _thumb_dims(size, thumb_size):
+    w, h  = size
+    scale = thumb_size / max(w, h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def _robust_bounds(counts, trim):
+    # ignore the outer `trim` share of mask pixels on each side so stray
+    # green specks in the background don't stretch the box
+    cum   = np.cumsum(counts)
+    total = cum[-1]
+    lo    = int(np.searchsorted(cum, total * trim))
+    hi    = int(np.searchsorted(cum, total * (1 - trim)))
+    return lo, hi + 1
+
+def leaf_bbox(image, thumb_size=THUMB_SIZE, margin=0.08, trim=0.01):
+    mask     = leaf_mask(image, thumb_size)
+    fraction = mask.mean()
+    if fraction < MIN_FRACTION or fraction > MAX_FRACTION:
+        return None
+    top, bottom = _robust_bounds(mask.sum(axis=1), trim)
+    left, right = _robust_bounds(mask.sum(axis=0), trim)
+
+    W, H   = image.size
+    sx, sy = W / mask.shape[1], H / mask.shape[0]
+    cx, cy = (left + right) / 2 * sx, (top + bottom) / 2 * sy
+    side   = max((right - left) * sx, (bottom - top) * sy) * (1 + 2 * margin)
+    bw, bh = min(side, W), min(side, H)
+    x0     = int(round(min(max(cx - bw / 2, 0), W - bw)))
+    y0     = int(round(min(max(cy - bh / 2, 0), H - bh)))
+    x1, y1 = int(round(min(x0 + bw, W))), int(round(min(y0 + bh, H)))
+    if (x1 - x0) * (y1 - y0) > 0.9 * W * H:
+        return None
+    return x0, y0, x1, y1
+
+def crop_to_leaf(image, thumb_size=THUMB_SIZE, margin=0.08):
+    box = leaf_bbox(image, thumb_size, margin)
+    return image if box is None else image.crop(box)
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# ─────────────────────────────────────────────
+#  Bytes sent and latency per Streamlit rerun
+#
+#  python measure_rerun.py --page Demo                 # static assets (default)
+#  python measure_rerun.py --page Demo --inline        # old inline CSS/game
+#
+#  Runs app1.py headless with streamlit.testing.AppTest and sums the
+#  serialized size of every element the script emits on a rerun.
+# ─────────────────────────────────────────────
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _walk(node):
+    yield node
+    children = getattr(node, "children", None)
+    if isinstance(children, dict):
+        for child in children.values():
+            yield from _walk(child)
+
+def payload_bytes(at):
+    total = 0
+    for node in _walk(at._tree):
+        proto = getattr(node, "proto", None)
+        if proto is not None and hasattr(proto, "ByteSize"):
+            total += proto.ByteSize()
+    return total
+
+def measure(app, page, reruns, inline):
+    from streamlit.testing.v1 import AppTest
+    os.environ["PLANTAI_INLINE_ASSETS"] = "1" if inline else "0"
+    if not inline and not os.environ.get("PLANTAI_STATIC_URL"):
+        os.environ.setdefault("PLANTAI_STATIC_PORT", "8502")
+    at = AppTest.from_file(app, default_timeout=300)
+    at.query_params["page"] = page
+    at.run()                                   # first run: model load, asset publish
+    times, sizes = [], []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t0)
+        sizes.append(payload_bytes(at))
+    return {
+        "page":             page,
+        "inline_assets":    inline,
+        "reruns":           reruns,
+        "bytes_per_rerun":  int(statistics.median(sizes)),
+        "rerun_median_ms":  round(statistics.median(times) * 1e3, 2),
+        "rerun_min_ms":     round(min(times) * 1e3, 2),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bytes sent and latency per rerun")
+    parser.add_argument("--app", default=os.path.join(ROOT, "app1.py"))
+    parser.add_argument("--page", default="Demo", choices=["Home", "Demo", "Dev"])
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--inline", action="store_true", help="measure with PLANTAI_INLINE_ASSETS=1")
+    parser.add_argument("--both", action="store_true", help="measure inline and static back to back")
+    args = parser.parse_args(argv)
+
+    modes = [True, False] if args.both else [args.inline]
+    rows  = [measure(args.app, args.page, args.reruns, m) for m in modes]
+    if args.both:
+        before, after = rows
+        print(f"bytes/rerun {before['bytes_per_rerun']} -> {after['bytes_per_rerun']}  "
+              f"rerun {before['rerun_median_ms']} ms -> {after['rerun_median_ms']} ms", file=sys.stderr)
+    print(json.dumps(rows, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import io
+import os
+import sys
+import json
+import random
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageEnhance
+
+# ─────────────────────────────────────────────
+#  Near-duplicate / burst-upload detection
+#
+#  64-bit dHash per image, stored in a multi-index hash (MIH) table:
+#  the hash is cut into max_distance+1 chunks, so by pigeonhole any hash
+#  within max_distance bits shares at least one chunk exactly.  Lookups only
+#  verify the few entries in matching buckets.  Capacity is bounded with LRU
+#  eviction.
+# ─────────────────────────────────────────────
+HASH_BITS = 64
+
+def dhash(image, hash_size=8):
+    # reducing_gap box-filters large photos down first, so hashing a 12 MP upload stays cheap
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0)
+    small = np.asarray(small, dtype=np.int16)
+    bits  = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+def _chunk_masks(n_chunks):
+    widths = [HASH_BITS // n_chunks + (1 if i < HASH_BITS % n_chunks else 0) for i in range(n_chunks)]
+    masks, shift = [], 0
+    for w in widths:
+        masks.append((shift, (1 << w) - 1))
+        shift += w
+    return masks
+
+class NearDuplicateIndex:
+    def __init__(self, max_distance=6, capacity=10_000):
+        self.max_distance = max_distance
+        self.capacity     = capacity
+        self._masks       = _chunk_masks(max_distance + 1)
+        self._buckets     = [dict() for _ in self._masks]
+        self._entries     = OrderedDict()
+        self._lock        = threading.Lock()
+        self.hits         = 0
+        self.misses       = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _chunks(self, h):
+        return [(h >> shift) & mask for shift, mask in self._masks]
+
+    def lookup(self, h):
+        with self._lock:
+            best, best_d = None, self.max_distance + 1
+            for bucket, chunk in zip(self._buckets, self._chunks(h)):
+                for cand in bucket.get(chunk, ()):
+                    d = hamming(h, cand)
+                    if d < best_d:
+                        best, best_d = cand, d
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best)
+            return self._entries[best], best_d
+
+    def add(self, h, value):
+        with self._lock:
+            if h in self._entries:
+                self._entries[h] = value
+                self._entries.move_to_end(h)
+                return
+            self._entries[h] = value
+            for bucket, chunk in zip(self._buckets, self._chunks(h)):
+                bucket.setdefault(chunk, set()).add(h)
+            while len(self._entries) > self.capacity:
+                old, _ = self._entries.popitem(last=False)
+                for bucket, chunk in zip(self._buckets, self._chunks(old)):
+                    s = bucket[chunk]
+                    s.discard(old)
+                    if not s:
+                        del bucket[chunk]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+# ─────────────────────────────────────────────
+#  False-hit report on a labeled folder
+#
+#  python near_duplicate.py "plantvillage dataset/color" --distances 0 2 4 6 8 10
+#
+#  Every image is looked up, then inserted with its folder label.  A hit whose
+#  cached label differs from the true label is a false hit.  With --burst each
+#  image is also followed by a few jittered copies (crop/brightness/rotation)
+#  to estimate how often real burst uploads are caught.
+# ─────────────────────────────────────────────
+def _jitter(image, rng):
+    w, h   = image.size
+    dx, dy = int(w * rng.uniform(0, .04)), int(h * rng.uniform(0, .04))
+    img    = image.crop((dx, dy, w - int(w * rng.uniform(0, .04)), h - int(h * rng.uniform(0, .04))))
+    img    = ImageEnhance.Brightness(img).enhance(rng.uniform(.9, 1.1))
+    img    = img.rotate(rng.uniform(-3, 3), resample=Image.BILINEAR)
+    buf    = io.BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=int(rng.uniform(75, 95)))
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+def _labeled_hashes(data_dir, burst, limit_per_class, seed):
+    rng  = random.Random(seed)
+    rows = []
+    for label in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        for fname in files[:limit_per_class]:
+            with Image.open(os.path.join(folder, fname)) as img:
+                img.load()
+                rows.append((label, dhash(img), False))
+                for _ in range(burst):
+                    rows.append((label, dhash(_jitter(img, rng)), True))
+    return rows
+
+def false_hit_report(rows, distances, capacity):
+    report = []
+    for dist in distances:
+        index = NearDuplicateIndex(max_distance=dist, capacity=capacity)
+        hits = false_hits = burst_total = burst_hits = 0
+        for label, h, is_burst in rows:
+            found = index.lookup(h)
+            if is_burst:
+                burst_total += 1
+            if found is not None:
+                hits += 1
+                if found[0] != label:
+                    false_hits += 1
+                elif is_burst:
+                    burst_hits += 1
+            index.add(h, label)
+        report.append({
+            "max_distance":    dist,
+            "lookups":         len(rows),
+            "hit_rate":        round(hits / len(rows), 4),
+            "false_hit_rate":  round(false_hits / len(rows), 4),
+            "false_hit_share": round(false_hits / hits, 4) if hits else 0.0,
+            "burst_recall":    round(burst_hits / burst_total, 4) if burst_total else None,
+        })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate index false-hit report")
+    parser.add_argument("data_dir", help="folder with one sub-folder per class label")
+    parser.add_argument("--distances", type=int, nargs="+", default=[0, 2, 4, 6, 8, 10, 12])
+    parser.add_argument("--burst", type=int, default=0, help="jittered copies per image")
+    parser.add_argument("--limit-per-class", type=int, default=200)
+    parser.add_argument("--capacity", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rows = _labeled_hashes(args.data_dir, args.burst, args.limit_per_class, args.seed)
+    print(json.dumps(false_hit_report(rows, args.distances, args.capacity), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import requests
+
+# ─────────────────────────────────────────────
+#  Bundled knowledge base
+#  knowledge_base.json holds structured treatment/prevention advice for every
+#  label in class_indices.json; it is loaded once into a dict, so lookups
+#  need no network at all.
+# ─────────────────────────────────────────────
+KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json")
+
+_KB = None
+
+def load_knowledge_base(path=KB_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def knowledge_base():
+    global _KB
+    if _KB is None:
+        _KB = load_knowledge_base()
+    return _KB
+
+def kb_version():
+    return knowledge_base()["version"]
+
+def lookup(disease_name):
+    return knowledge_base()["entries"].get(disease_name)
+
+def format_entry(entry):
+    if entry["pathogen"] is None:
+        lines = [f"**{entry['crop']} — healthy.** {entry['symptoms']}", "", "**Care tips:**"]
+        lines += [f"- {tip}" for tip in entry["prevention"]]
+        return "\n".join(lines)
+    lines  = [f"**{entry['crop']} — {entry['condition']}** ({entry['pathogen']})", "",
+              f"**Symptoms:** {entry['symptoms']}", "", "**Treatment:**"]
+    lines += [f"- {step}" for step in entry["treatment"]]
+    lines += ["", "**Prevention:**"]
+    lines += [f"- {step}" for step in entry["prevention"]]
+    return "\n".join(lines)
+
+_FORMATTED = {}
+
+def kb_recommendations(disease_name):
+    if disease_name not in _FORMATTED:
+        entry = lookup(disease_name)
+        _FORMATTED[disease_name] = format_entry(entry) if entry else None
+    return _FORMATTED[disease_name]
+
+def check_knowledge_base(class_indices, kb):
+    problems = []
+    entries  = kb.get("entries", {})
+    for label in class_indices.values():
+        entry = entries.get(label)
+        if entry is None:
+            problems.append(f"missing entry: {label}")
+            continue
+        for field in ("crop", "condition", "symptoms", "prevention"):
+            if not entry.get(field):
+                problems.append(f"{label}: empty '{field}'")
+        if entry.get("pathogen") and not entry.get("treatment"):
+            problems.append(f"{label}: disease entry without treatment")
+    for label in set(entries) - set(class_indices.values()):
+        problems.append(f"entry for unknown class: {label}")
+    return problems
+
+# ─────────────────────────────────────────────
+#  AI treatment recommendations (OpenRouter) — optional enrichment
+# ─────────────────────────────────────────────
+OPENROUTER_API_KEY = "YOUR_API_KEY"
+OPENROUTER_URL     = "https://openrouter.ai/api/v1/chat/completions"
+
+CACHE = {}
+
+def fetch_recommendations(disease_name):
+    if disease_name in CACHE:
+        return CACHE[disease_name]
+    prompt = (f"The plant is healthy ({disease_name}). Give maintenance tips."
+              if "healthy" in disease_name.lower()
+              else f"Suggest treatment and prevention for {disease_name} in plants.")
+    try:
+        r = requests.post(
+            OPENROUTER_URL,
+            headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"},
+            json={"model": "openai/gpt-4o-mini", "messages": [{"role": "user", "content": prompt}]},
+            timeout=30
+        )
+        data = r.json()
+        if "error" in data:
+            return f"API Error: {data['error']['message']}"
+        result = data["choices"][0]["message"]["content"]
+        CACHE[disease_name] = result
+        return result
+    except Exception as e:
+        return f"Exception: {e}"
+
+def cached_or_static_recommendations(disease_name):
+    # never touches the network: knowledge base, then earlier LLM answers, then generic advice
+    kb = kb_recommendations(disease_name)
+    if kb is not None:
+        return kb
+    if disease_name in CACHE:
+        return CACHE[disease_name]
+    if "healthy" in disease_name.lower():
+        return ("The plant looks healthy. Keep watering at the base, give it good airflow and "
+                "sunlight, and check the leaves regularly for new spots.")
+    return ("Remove and destroy the affected leaves, avoid overhead watering, improve airflow "
+            "between plants and rotate crops. Ask a local agronomist about a suitable "
+            f"fungicide or bactericide for {disease_name.replace('___', ' – ').replace('_', ' ')}.")
+
+if __name__ == "__main__":
+    # python recommendations.py [class_indices.json] — validates the bundled knowledge base offline
+    root     = os.path.dirname(os.path.abspath(__file__))
+    ci_path  = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "app", "class_indices.json")
+    with open(ci_path) as f:
+        problems = check_knowledge_base(json.load(f), knowledge_base())
+    for p in problems:
+        print(p)
+    print(f"knowledge base {kb_version()}: {'OK' if not problems else f'{len(problems)} problem(s)'}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image
+
+from inference import IMG_SIZE, preprocess_into, model_path
+from leaf_crop import crop_to_leaf
+from validation import decode_upload
+
+# ─────────────────────────────────────────────
+#  Multi-process serving with a shared-memory ring buffer
+#
+#  N decode workers  ──►  ring of (slots, 128, 128, 3) float32  ──►  1 inference process
+#
+#  Workers claim slots in sequence order, so the inference process can hand
+#  any contiguous run of ready slots to model.predict as a zero-copy view.
+# ─────────────────────────────────────────────
+SLOT_SHAPE = IMG_SIZE + (3,)
+EMPTY, READY, FAILED = 0, 1, 2
+
+class ShmRing:
+    def __init__(self, n_slots, name=None):
+        self.n_slots   = n_slots
+        data_bytes     = n_slots * int(np.prod(SLOT_SHAPE)) * 4
+        meta_bytes     = n_slots * 8 * 2
+        create         = name is None
+        self.shm       = shared_memory.SharedMemory(name=name, create=create,
+                                                     size=data_bytes + meta_bytes)
+        self.data      = np.ndarray((n_slots,) + SLOT_SHAPE, dtype=np.float32, buffer=self.shm.buf)
+        meta           = np.ndarray((2, n_slots), dtype=np.int64, buffer=self.shm.buf, offset=data_bytes)
+        self.state     = meta[0]
+        self.job_ids   = meta[1]
+        if create:
+            self.state[:] = EMPTY
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        # drop the numpy views before closing or the mmap stays exported
+        del self.data, self.state, self.job_ids
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+def _open_source(source):
+    # upload bytes get the same capped, upright RGB decode as validate()
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        return decode_upload(bytes(source))
+    return Image.open(source)
+
+def decode_worker(ring_name, n_slots, tasks, free, cursor, crop_leaf=False):
+    ring = ShmRing(n_slots, name=ring_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            job_id, source = task
+            free.acquire()
+            with cursor.get_lock():
+                seq           = cursor.value
+                cursor.value += 1
+            slot = seq % n_slots
+            ring.job_ids[slot] = job_id
+            try:
+                image = _open_source(source)
+                preprocess_into(crop_to_leaf(image) if crop_leaf else image, ring.data[slot])
+                ring.state[slot] = READY
+            except Exception:
+                ring.state[slot] = FAILED
+    finally:
+        ring.close()
+
+def inference_worker(ring_name, n_slots, free, results, stop, model_file, max_batch):
+    ring  = ShmRing(n_slots, name=ring_name)
+    model = None
+    if model_file:
+        import tensorflow as tf
+        model = tf.keras.models.load_model(model_file)
+    head = 0
+    try:
+        while not (stop.is_set() and ring.state[head % n_slots] == EMPTY):
+            start = head % n_slots
+            if ring.state[start] == EMPTY:
+                time.sleep(0.0002)
+                continue
+            # contiguous run of finished slots, never wrapping past the end of the ring
+            end = start
+            limit = min(start + max_batch, n_slots)
+            while end < limit and ring.state[end] != EMPTY:
+                end += 1
+            states = ring.state[start:end].copy()
+            jobs   = ring.job_ids[start:end].copy()
+            ok     = states == READY
+            idx    = np.full(end - start, -1, dtype=np.int64)
+            conf   = np.zeros(end - start, dtype=np.float32)
+            t0     = time.perf_counter()
+            if model is not None and ok.any():
+                batch = ring.data[start:end]   # zero-copy view into shared memory
+                preds = model.predict(batch, verbose=0)
+                idx   = np.where(ok, np.argmax(preds, axis=1), -1)
+                conf  = np.where(ok, preds.max(axis=1), 0.0)
+            elapsed = time.perf_counter() - t0
+            ring.state[start:end] = EMPTY
+            for _ in range(end - start):
+                free.release()
+            head += end - start
+            results.put([(int(j), int(i), float(c)) for j, i, c in zip(jobs, idx, conf)]
+                        + [("batch", end - start, elapsed)])
+    finally:
+        ring.close()
+
+class ShmInferenceServer:
+    def __init__(self, n_workers=None, n_slots=64, max_batch=32, model_file=model_path, crop_leaf=False):
+        self.n_workers  = n_workers or os.cpu_count() or 1
+        self.n_slots    = n_slots
+        ctx             = mp.get_context("spawn")
+        self.ring       = ShmRing(n_slots)
+        self.tasks      = ctx.Queue()
+        self.results    = ctx.Queue()
+        self.free       = ctx.Semaphore(n_slots)
+        self.cursor     = ctx.Value("q", 0)
+        self.stop_event = ctx.Event()
+        self.batches    = []
+        self._next_id   = 0
+        self._id_lock   = threading.Lock()
+        self._pending   = {}
+        self._decoders  = [
+            ctx.Process(target=decode_worker, daemon=True,
+                        args=(self.ring.name, n_slots, self.tasks, self.free, self.cursor, crop_leaf))
+            for _ in range(self.n_workers)]
+        self._infer     = ctx.Process(target=inference_worker, daemon=True,
+                                      args=(self.ring.name, n_slots, self.free, self.results,
+                                            self.stop_event, model_file, max_batch))
+        for p in self._decoders + [self._infer]:
+            p.start()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        while True:
+            items = self.results.get()
+            if items is None:
+                break
+            for job_id, idx, conf in items:
+                if job_id == "batch":
+                    self.batches.append((idx, conf))
+                    continue
+                waiter = self._pending.pop(job_id, None)
+                if waiter is not None:
+                    waiter[1].append((idx, conf))
+                    waiter[0].set()
+
+    def submit(self, source):
+        with self._id_lock:
+            job_id = self._next_id
+            self._next_id += 1
+        waiter = (threading.Event(), [])
+        self._pending[job_id] = waiter
+        self.tasks.put((job_id, source))
+        return waiter
+
+    def classify(self, source, timeout=30):
+        done, out = self.submit(source)
+        if not done.wait(timeout):
+            raise TimeoutError("inference server did not answer in time")
+        return out[0]
+
+    def close(self):
+        for _ in self._decoders:
+            self.tasks.put(None)
+        for p in self._decoders:
+            p.join()
+        self.stop_event.set()
+        self._infer.join()
+        self.results.put(None)
+        self._collector.join()
+        self.ring.close()
+        self.ring.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ─────────────────────────────────────────────
+#  Scaling benchmark over 1..N decode workers
+# ─────────────────────────────────────────────
+def _list_images(folder):
+    exts = (".jpg", ".jpeg", ".png")
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(exts))
+
+def run_scaling_benchmark(image_dir, max_workers, repeat, model_file, max_batch):
+    files = _list_images(image_dir)
+    # read the files up front so the benchmark measures decode, not disk
+    blobs = [open(p, "rb").read() for p in files] * repeat
+    rows  = []
+    for n in range(1, max_workers + 1):
+        with ShmInferenceServer(n_workers=n, max_batch=max_batch, model_file=model_file) as srv:
+            srv.classify(blobs[0], timeout=120)   # warm-up: spawn + model load
+            t0      = time.perf_counter()
+            waiters = [srv.submit(b) for b in blobs]
+            for done, _ in waiters:
+                done.wait()
+            elapsed = time.perf_counter() - t0
+            sizes   = [s for s, _ in srv.batches[1:]] or [0]
+        rows.append({"workers": n, "images": len(blobs), "seconds": round(elapsed, 4),
+                     "images_per_sec": round(len(blobs) / elapsed, 2),
+                     "mean_batch": round(float(np.mean(sizes)), 2)})
+        print(f"workers={n:2d}  {rows[-1]['images_per_sec']:8.1f} img/s  "
+              f"mean batch={rows[-1]['mean_batch']}", file=sys.stderr)
+    base = rows[0]["images_per_sec"]
+    for r in rows:
+        r["speedup"] = round(r["images_per_sec"] / base, 2)
+    return rows
+
+def main(argv=None):
+    root   = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Shared-memory serving scaling benchmark")
+    parser.add_argument("--images", default=os.path.join(root, "test_images"))
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--model", default=model_path)
+    parser.add_argument("--decode-only", action="store_true",
+                        help="skip model.predict and measure decode/preprocess scaling only")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+
+    rows = run_scaling_benchmark(args.images, args.max_workers, args.repeat,
+                                 None if args.decode_only else args.model, args.batch)
+    text = json.dumps(rows, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+from inference import IMG_SIZE, preprocess_into, load_model, model_path, predict_with_embedding
+from leaf_crop import crop_to_leaf
+
+# ─────────────────────────────────────────────
+#  Similar-case search over Dense(128) embeddings
+#
+#  Vectors are L2-normalised and kept as float16 (256 bytes per image), on
+#  disk and in memory.  Queries score them in blocks widened into a small
+#  float32 scratch buffer; with n_lists > 0 the index is partitioned
+#  IVF-style by k-means and only the n_probe closest lists are scanned.
+#  The index records whether references were leaf-cropped, and queries must
+#  be embedded the same way.
+# ─────────────────────────────────────────────
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "similar_cases.npz")
+BLOCK      = 4096
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    n = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(n, 1e-12)
+
+def kmeans(x, k, iters=15, sample=50_000, seed=0):
+    rng  = np.random.default_rng(seed)
+    pts  = x[rng.choice(len(x), min(sample, len(x)), replace=False)]
+    cent = pts[rng.choice(len(pts), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(pts @ cent.T, axis=1)
+        sums   = np.zeros_like(cent)
+        np.add.at(sums, assign, pts)
+        counts = np.bincount(assign, minlength=k)[:, None]
+        empty  = counts[:, 0] == 0
+        cent   = np.where(empty[:, None], cent, sums / np.maximum(counts, 1))
+        cent   = _normalize(cent)
+    return cent
+
+class EmbeddingIndex:
+    def __init__(self, vectors, labels=None, paths=None, n_lists=0, seed=0, crop_leaf=False):
+        vectors        = _normalize(vectors)
+        self.crop_leaf = crop_leaf
+        self.labels  = np.asarray(labels if labels is not None else [""] * len(vectors))
+        self.paths   = np.asarray(paths if paths is not None else [""] * len(vectors))
+        self.n_lists = n_lists
+        if n_lists:
+            self.centroids = kmeans(vectors, n_lists, seed=seed)
+            assign         = self._assign(vectors)
+            order          = np.argsort(assign, kind="stable")
+            # store rows grouped by list so each list is one contiguous slice
+            vectors, self.labels, self.paths = vectors[order], self.labels[order], self.paths[order]
+            self.offsets   = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        else:
+            self.centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            self.offsets   = np.array([0, len(vectors)])
+        self.vectors = vectors.astype(np.float16)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _assign(self, vectors, block=16_384):
+        out = np.empty(len(vectors), dtype=np.int64)
+        for s in range(0, len(vectors), block):
+            out[s:s + block] = np.argmax(vectors[s:s + block] @ self.centroids.T, axis=1)
+        return out
+
+    def _scores(self, q, start, stop, scratch):
+        out = np.empty(stop - start, dtype=np.float32)
+        for s in range(start, stop, BLOCK):
+            e = min(s + BLOCK, stop)
+            np.copyto(scratch[:e - s], self.vectors[s:e])
+            np.matmul(scratch[:e - s], q, out=out[s - start:e - start])
+        return out
+
+    def search(self, vector, k=5, n_probe=4):
+        q = _normalize(vector).ravel()
+        if self.n_lists:
+            lists  = np.argsort(-(self.centroids @ q))[:n_probe]
+            ranges = [(self.offsets[l], self.offsets[l + 1]) for l in lists]
+        else:
+            ranges = [(0, len(self))]
+        scratch = np.empty((BLOCK, self.vectors.shape[1]), dtype=np.float32)
+        rows    = np.concatenate([np.arange(a, b) for a, b in ranges])
+        scores  = np.concatenate([self._scores(q, a, b, scratch) for a, b in ranges])
+        if len(scores) == 0:
+            return rows, scores
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def query(self, vector, k=5, n_probe=4):
+        rows, scores = self.search(vector, k, n_probe)
+        return [(float(s), str(self.labels[r]), str(self.paths[r])) for r, s in zip(rows, scores)]
+
+    def save(self, path=INDEX_PATH):
+        np.savez(path, vectors=self.vectors, labels=self.labels, paths=self.paths,
+                 centroids=self.centroids, offsets=self.offsets, n_lists=self.n_lists,
+                 crop_leaf=self.crop_leaf)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        data = np.load(path, allow_pickle=False)
+        self = cls.__new__(cls)
+        self.vectors   = data["vectors"]
+        self.labels    = data["labels"]
+        self.paths     = data["paths"]
+        self.centroids = data["centroids"]
+        self.offsets   = data["offsets"]
+        self.n_lists   = int(data["n_lists"])
+        self.crop_leaf = bool(data["crop_leaf"]) if "crop_leaf" in data.files else False
+        return self
+
+# ─────────────────────────────────────────────
+#  Build from a labeled reference folder
+# ─────────────────────────────────────────────
+def embed_image(model, image, crop_leaf=False):
+    x = np.empty((1,) + IMG_SIZE + (3,), dtype=np.float32)
+    preprocess_into(crop_to_leaf(image) if crop_leaf else image, x[0])
+    _, emb = predict_with_embedding(model, x)
+    return emb[0]
+
+def embed_folder(model, data_dir, batch_size=64, crop_leaf=False):
+    from evaluate import IMAGE_EXTS
+    paths, labels = [], []
+    for label in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, label)
+        if os.path.isdir(folder):
+            for f in sorted(os.listdir(folder)):
+                if f.lower().endswith(IMAGE_EXTS):
+                    paths.append(os.path.join(folder, f))
+                    labels.append(label)
+    buf  = np.empty((batch_size,) + IMG_SIZE + (3,), dtype=np.float32)
+    embs = np.empty((len(paths), 128), dtype=np.float32)
+    for s in range(0, len(paths), batch_size):
+        chunk = paths[s:s + batch_size]
+        for j, p in enumerate(chunk):
+            with Image.open(p) as img:
+                preprocess_into(crop_to_leaf(img) if crop_leaf else img, buf[j])
+        _, emb = predict_with_embedding(model, buf[:len(chunk)])
+        embs[s:s + len(chunk)] = emb
+    return embs, labels, paths
+
+def benchmark(n, dim, n_lists, n_probe, k, queries, seed=0):
+    # clustered synthetic vectors, roughly like 38 classes of ReLU activations
+    rng     = np.random.default_rng(seed)
+    centers = np.abs(rng.normal(size=(38, dim)))
+    data    = np.maximum(centers[rng.integers(0, 38, n)] + rng.normal(0, .6, (n, dim)), 0).astype(np.float32)
+    qs      = data[rng.choice(n, queries, replace=False)] + rng.normal(0, .1, (queries, dim)).astype(np.float32)
+    rows    = []
+    exact   = None
+    for lists in (0, n_lists):
+        t0    = time.perf_counter()
+        index = EmbeddingIndex(data, paths=np.arange(n).astype(str), n_lists=lists, seed=seed)
+        build = time.perf_counter() - t0
+        index.search(qs[0], k, n_probe)
+        lat, found = [], []
+        for q in qs:
+            t1      = time.perf_counter()
+            hits, _ = index.search(q, k, n_probe)
+            lat.append(time.perf_counter() - t1)
+            found.append(set(index.paths[hits]))
+        if exact is None:
+            exact = found
+        recall = np.mean([len(a & b) / max(len(b), 1) for a, b in zip(found, exact)])
+        rows.append({"index": "ivf" if lists else "brute_force", "n": n, "n_lists": lists,
+                     "n_probe": n_probe if lists else None,
+                     "build_seconds": round(build, 3),
+                     "query_p50_ms": round(float(np.percentile(lat, 50)) * 1e3, 3),
+                     "query_p95_ms": round(float(np.percentile(lat, 95)) * 1e3, 3),
+                     f"recall@{k}": round(float(recall), 4),
+                     "store_mb": round(index.vectors.nbytes / 2**20, 2)})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Similar-case embedding index")
+    sub    = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="embed a labeled reference folder")
+    b.add_argument("data_dir")
+    b.add_argument("--model", default=model_path)
+    b.add_argument("--n-lists", type=int, default=0, help="IVF partitions (0 = brute force)")
+    b.add_argument("--batch", type=int, default=64)
+    b.add_argument("--crop-leaf", action="store_true",
+                   help="crop references to the leaf; match the app's PLANTAI_LEAF_CROP")
+    b.add_argument("--out", default=INDEX_PATH)
+    q = sub.add_parser("query", help="top-k neighbours of one image")
+    q.add_argument("image")
+    q.add_argument("--model", default=model_path)
+    q.add_argument("--index", default=INDEX_PATH)
+    q.add_argument("-k", type=int, default=5)
+    bm = sub.add_parser("bench", help="build-time and query-latency benchmark on synthetic vectors")
+    bm.add_argument("--n", type=int, default=50_000)
+    bm.add_argument("--dim", type=int, default=128)
+    bm.add_argument("--n-lists", type=int, default=64)
+    bm.add_argument("--n-probe", type=int, default=4)
+    bm.add_argument("-k", type=int, default=10)
+    bm.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        embs, labels, paths = embed_folder(load_model(args.model), args.data_dir, args.batch, args.crop_leaf)
+        t1 = time.perf_counter()
+        index = EmbeddingIndex(embs, labels, paths, n_lists=args.n_lists, crop_leaf=args.crop_leaf)
+        index.save(args.out)
+        print(f"{len(index)} images: embed {t1 - t0:.1f}s, index {time.perf_counter() - t1:.2f}s -> {args.out}")
+    elif args.cmd == "query":
+        index = EmbeddingIndex.load(args.index)
+        with Image.open(args.image) as img:
+            emb = embed_image(load_model(args.model), img, index.crop_leaf)
+        for score, label, path in index.query(emb, k=args.k):
+            print(f"{score:.3f}  {label:45s}  {path}")
+    else:
+        print(json.dumps(benchmark(args.n, args.dim, args.n_lists, args.n_probe, args.k, args.queries), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
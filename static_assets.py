@@ -0,0 +1,81 @@
+import os
+import glob
+import hashlib
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# ─────────────────────────────────────────────
+#  Static front-end assets
+#
+#  The theme CSS and the Pixel Plant Defender game live in frontend/.  When
+#  enabled (PLANTAI_STATIC_URL or PLANTAI_STATIC_PORT) they are copied to
+#  static/ under content-hashed names and served with long-lived immutable
+#  cache headers, so each Streamlit rerun only sends a <link> / <iframe src>
+#  instead of ~23 KB of inline HTML.  Streamlit's own static serving can't be
+#  used: it forces text/plain for .css/.html.
+# ─────────────────────────────────────────────
+ROOT         = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DIR = os.path.join(ROOT, "frontend")
+STATIC_DIR   = os.path.join(ROOT, "static")
+ASSETS       = ("theme.css", "game.html")
+MAX_AGE      = 365 * 24 * 3600
+
+def read_asset(name):
+    with open(os.path.join(FRONTEND_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def publish(names=ASSETS, static_dir=STATIC_DIR):
+    os.makedirs(static_dir, exist_ok=True)
+    hashed = {}
+    for name in names:
+        with open(os.path.join(FRONTEND_DIR, name), "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        fname     = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        dst       = os.path.join(static_dir, fname)
+        if not os.path.exists(dst):
+            tmp = dst + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dst)
+        for old in glob.glob(os.path.join(static_dir, f"{stem}.*{ext}")):
+            if old != dst:
+                os.remove(old)
+        hashed[name] = fname
+    return hashed
+
+class _ImmutableHandler(SimpleHTTPRequestHandler):
+    def end_headers(self):
+        # every file name carries its content hash, so it can be cached forever
+        self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, immutable")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def list_directory(self, path):
+        self.send_error(404)
+        return None
+
+    def log_message(self, *args):
+        pass
+
+_servers = {}
+
+def serve(port, static_dir=STATIC_DIR, host="0.0.0.0"):
+    # one server per port for the life of the process, even if Streamlit's
+    # resource cache is cleared and this gets called again
+    if port not in _servers:
+        httpd  = ThreadingHTTPServer((host, port), partial(_ImmutableHandler, directory=static_dir))
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        _servers[port] = httpd
+    return _servers[port]
+
+def base_url(port, request_host=None):
+    # PLANTAI_STATIC_URL lets a reverse proxy or CDN serve static/ instead
+    configured = os.environ.get("PLANTAI_STATIC_URL")
+    if configured:
+        return configured.rstrip("/")
+    # scheme-relative, so the browser keeps the page's http/https
+    host = (request_host or "localhost").rsplit(":", 1)[0]
+    return f"//{host}:{port}"
@@ -0,0 +1,245 @@
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import shutil
+import argparse
+import numpy as np
+from PIL import Image
+
+from leaf_crop import leaf_mask
+from inference import IMG_SIZE, generate_cache_key, load_and_preprocess_image, load_model
+
+# ─────────────────────────────────────────────
+#  Upload validation
+#
+#  Runs before hashing, preprocessing and model.predict, cheapest check first:
+#
+#    1. byte size
+#    2. header only (Image.open is lazy): format, dimensions, pixel count
+#    3. plant check on a tiny decode (JPEG draft at 1/8 scale) -- share of
+#       leaf-coloured pixels from the leaf_crop HSV mask
+#    4. decode_upload(): decode capped near `decode_side` since the model only
+#       sees 128x128 (JPEG draft, integer reduce() for PNG), EXIF orientation
+#       applied, converted to RGB.  shm_server workers decode upload bytes
+#       with the same function.
+#
+#  Rejections raise InvalidImage with a short reason code.
+# ─────────────────────────────────────────────
+FORMATS            = ("JPEG", "MPO", "PNG")
+JPEG_FORMATS       = ("JPEG", "MPO")  # MPO: phone JPEGs with a multi-picture header
+MAX_BYTES          = 10 * 2**20
+MAX_PIXELS         = 25_000_000
+MIN_SIDE           = 32
+DECODE_SIDE        = 512          # shorter side kept >= this, i.e. ~1000px for a 12 MP photo
+MIN_PLANT_FRACTION = 0.08         # leaf photos score 0.15+, documents/people/charts < 0.03
+ORIENTATION        = 0x0112
+
+class InvalidImage(ValueError):
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+_TRANSPOSE = {
+    2: (Image.Transpose.FLIP_LEFT_RIGHT,),
+    3: (Image.Transpose.ROTATE_180,),
+    4: (Image.Transpose.FLIP_TOP_BOTTOM,),
+    5: (Image.Transpose.TRANSPOSE,),
+    6: (Image.Transpose.ROTATE_270,),
+    7: (Image.Transpose.TRANSVERSE,),
+    8: (Image.Transpose.ROTATE_90,),
+}
+
+def _open(data):
+    try:
+        return Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError:
+        raise InvalidImage("too_many_pixels", "Image dimensions are too large.")
+    except Exception:
+        raise InvalidImage("unreadable", "The file is not a readable image.")
+
+def _decode(data, max_side=None):
+    img = _open(data)
+    if max_side and img.format in JPEG_FORMATS:
+        img.draft("RGB", (max_side, max_side))
+    try:
+        img.load()
+    except Exception:
+        raise InvalidImage("corrupt", "The image file is damaged or truncated.")
+    return img
+
+def check_header(data, max_bytes=MAX_BYTES, max_pixels=MAX_PIXELS):
+    if len(data) > max_bytes:
+        raise InvalidImage("too_many_bytes", f"File is larger than {max_bytes // 2**20} MB.")
+    img = _open(data)
+    if img.format not in FORMATS:
+        raise InvalidImage("unsupported_format", f"Unsupported image format: {img.format}.")
+    w, h = img.size
+    if w * h > max_pixels:
+        raise InvalidImage("too_many_pixels", f"Image is {w * h / 1e6:.0f} MP; the limit is {max_pixels / 1e6:.0f} MP.")
+    if min(w, h) < MIN_SIDE:
+        raise InvalidImage("too_small", f"Image is smaller than {MIN_SIDE}x{MIN_SIDE} pixels.")
+    return img
+
+def plant_fraction(img):
+    return float(leaf_mask(img).mean())
+
+def exif_orientation(img):
+    try:
+        return img.getexif().get(ORIENTATION, 1)
+    except Exception:
+        return 1
+
+def decode_upload(data, decode_side=DECODE_SIDE):
+    img    = _decode(data, decode_side)
+    orient = exif_orientation(img)
+    factor = min(img.size) // decode_side
+    if factor > 1:
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):   # e.g. palette indices can't be averaged
+            img = img.convert("RGB")
+        img = img.reduce(factor)
+    for op in _TRANSPOSE.get(orient, ()):
+        img = img.transpose(op)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+def validate(data, max_bytes=MAX_BYTES, max_pixels=MAX_PIXELS,
+             min_plant_fraction=MIN_PLANT_FRACTION, decode_side=DECODE_SIDE):
+    header = check_header(data, max_bytes, max_pixels)
+    if header.format in JPEG_FORMATS:
+        full  = None
+        thumb = _decode(data, 96)
+    else:
+        full = thumb = decode_upload(data, decode_side)
+    if min_plant_fraction and plant_fraction(thumb) < min_plant_fraction:
+        raise InvalidImage("not_a_plant", "This doesn't look like a plant leaf photo.")
+    if full is None:
+        full = decode_upload(data, decode_side)
+    return full
+
+# ─────────────────────────────────────────────
+#  Mixed-corpus benchmark
+#
+#  python validation.py --make-corpus corpus/ --leaves test_images/
+#  python validation.py corpus/ --model trained_model/plant_disease_prediction_model.h5
+#
+#  Runs every file through the old path (open, decode, hash, preprocess,
+#  predict) and through validate() + the same path for accepted files, and
+#  reports the CPU time each spent.
+# ─────────────────────────────────────────────
+def _png_with_header(size):
+    # tiny valid PNG whose IHDR claims `size`: a decompression bomb stand-in
+    buf = io.BytesIO()
+    Image.new("L", (8, 8)).save(buf, "PNG")
+    raw  = bytearray(buf.getvalue())
+    ihdr = raw[12:29]
+    ihdr[4:12] = struct.pack(">II", *size)
+    raw[12:29] = ihdr
+    raw[29:33] = struct.pack(">I", zlib.crc32(bytes(ihdr)) & 0xFFFFFFFF)
+    return bytes(raw)
+
+def make_corpus(out_dir, leaves_dir, seed=0):
+    rng    = np.random.default_rng(seed)
+    leaves = sorted(os.path.join(leaves_dir, f) for f in os.listdir(leaves_dir)
+                    if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    os.makedirs(out_dir, exist_ok=True)
+
+    def save(name, img, fmt="JPEG", **kw):
+        img.save(os.path.join(out_dir, name), fmt, **kw)
+
+    for i, p in enumerate(leaves):
+        shutil.copy(p, os.path.join(out_dir, f"leaf_{i}{os.path.splitext(p)[1].lower()}"))
+        with Image.open(p) as leaf:
+            big = leaf.convert("RGB").resize((4000, 3000), Image.BICUBIC)
+            save(f"leaf_{i}_12mp.jpg", big, quality=90)
+            exif = Image.Exif()
+            exif[ORIENTATION] = 6
+            save(f"leaf_{i}_rotated.jpg", leaf.convert("RGB").rotate(90, expand=True), exif=exif)
+    save("huge_50mp.jpg", Image.new("RGB", (8660, 5780), (60, 140, 50)), quality=80)
+    with open(os.path.join(out_dir, "bomb.png"), "wb") as f:
+        f.write(_png_with_header((40_000, 40_000)))
+    with open(os.path.join(out_dir, "truncated.jpg"), "wb") as f, open(leaves[0], "rb") as src:
+        f.write(src.read()[:2000])
+    with open(os.path.join(out_dir, "not_an_image.jpg"), "wb") as f:
+        f.write(rng.bytes(50_000))
+    noise = (rng.random((1080, 1920, 3)) * 255).astype(np.uint8)
+    save("document.png", Image.new("RGB", (1240, 1754), (250, 250, 250)), "PNG")
+    save("sky.jpg", Image.new("RGB", (3000, 2000), (90, 150, 230)), quality=90)
+    save("noise.jpg", Image.fromarray(noise), quality=90)
+    save("portrait.jpg", Image.new("RGB", (2000, 3000), (215, 170, 140)), quality=90)
+    return sorted(os.listdir(out_dir))
+
+def _baseline(data, model):
+    img = Image.open(io.BytesIO(data))
+    generate_cache_key(img)
+    x = load_and_preprocess_image(img)
+    if model is not None:
+        model.predict(x, verbose=0)
+
+def _validated(data, model):
+    img = validate(data)
+    generate_cache_key(img)
+    x = load_and_preprocess_image(img)
+    if model is not None:
+        model.predict(x, verbose=0)
+
+def run_corpus(corpus_dir, model=None):
+    rows = []
+    for name in sorted(os.listdir(corpus_dir)):
+        with open(os.path.join(corpus_dir, name), "rb") as f:
+            data = f.read()
+        row = {"file": name, "bytes": len(data)}
+        for key, fn in (("baseline", _baseline), ("validated", _validated)):
+            t0 = time.process_time()
+            try:
+                fn(data, model)
+                row[key] = "ok"
+            except InvalidImage as e:
+                row[key] = e.reason
+            except Exception as e:
+                row[key] = f"error: {type(e).__name__}"
+            row[f"{key}_cpu_ms"] = round((time.process_time() - t0) * 1e3, 2)
+        rows.append(row)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate uploads / measure CPU saved on a mixed corpus")
+    parser.add_argument("corpus", help="folder of mixed uploads")
+    parser.add_argument("--make-corpus", action="store_true", help="first generate a synthetic mixed corpus")
+    parser.add_argument("--leaves", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_images"))
+    parser.add_argument("--model", default=None, help="include model.predict in both paths")
+    args = parser.parse_args(argv)
+
+    if args.make_corpus:
+        make_corpus(args.corpus, args.leaves)
+    model = None
+    if args.model:
+        os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+        os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+        model = load_model(args.model)
+        model.predict(np.zeros((1,) + IMG_SIZE + (3,), np.float32), verbose=0)
+
+    rows = run_corpus(args.corpus, model)
+    for r in rows:
+        print(f"{r['file']:32s} {r['baseline']:22s} {r['baseline_cpu_ms']:9.1f} ms   "
+              f"{r['validated']:16s} {r['validated_cpu_ms']:9.1f} ms", file=sys.stderr)
+    before = sum(r["baseline_cpu_ms"] for r in rows)
+    after  = sum(r["validated_cpu_ms"] for r in rows)
+    summary = {
+        "files":            len(rows),
+        "rejected":         {r["validated"]: sum(1 for x in rows if x["validated"] == r["validated"])
+                             for r in rows if r["validated"] != "ok"},
+        "baseline_cpu_ms":  round(before, 1),
+        "validated_cpu_ms": round(after, 1),
+        "cpu_saved":        round(1 - after / before, 4) if before else None,
+        "rows":             rows,
+    }
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())